@@ -0,0 +1,73 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''miniyaml benchmark: single pass parser vs the historical regex based
+implementation, on large lobby and rules payloads'''
+
+import timeit
+
+from oratools import miniyaml
+from tests import legacy_miniyaml
+
+
+def _lobby(nb_clients):
+    lines = ['GlobalSettings:', '\tServerName: Benchmark', '\tMap: abcdef', '\tLobbyOptions:']
+    lines += [f'\t\tOption@{i}:\n\t\t\tId: option{i}\n\t\t\tValue: True' for i in range(20)]
+    for i in range(nb_clients):
+        lines += [
+            f'Client@{i}:',
+            f'\tIndex: {i}',
+            f'\tName: Player {i}',
+            '\tColor: FF0000',
+            '\tFaction: Random',
+            f'\tSpawnPoint: {i % 8}',
+            f'\tTeam: {i % 2}',
+            '\tSlot: Multi0',
+            '\tState: Ready',
+            '\tIsAdmin: False',
+        ]
+    return '\n'.join(lines).encode()
+
+
+def _rules(nb_actors):
+    lines = []
+    for i in range(nb_actors):
+        lines.append(f'ACTOR{i}:')
+        for j in range(10):
+            lines.append(f'\tTrait{j}:')
+            lines += [f'\t\tProperty{k}: {i * j * k}' for k in range(3)]
+            lines.append('\t\tEmpty:')
+    return '\n'.join(lines).encode()
+
+
+def run():
+    print(f'{"payload":>16} {"size":>10} {"legacy (ms)":>12} {"single (ms)":>12} {"speedup":>8}')
+    payloads = [
+        ('lobby', _lobby(16)),
+        ('large lobby', _lobby(1000)),
+        ('rules', _rules(2000)),
+    ]
+    for name, data in payloads:
+        assert miniyaml.load(data) == legacy_miniyaml.load(data)
+        number = 10
+        legacy = min(timeit.repeat(lambda: legacy_miniyaml.load(data), number=number, repeat=5)) / number
+        single = min(timeit.repeat(lambda: miniyaml.load(data), number=number, repeat=5)) / number
+        print(f'{name:>16} {len(data):>10} {legacy * 1e3:>12.3f} {single * 1e3:>12.3f} {legacy / single:>7.2f}x')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''Order decoding benchmark: cursor based parsing vs the historical
+re-slicing implementation, on CreateGroup orders of increasing size'''
+
+import struct
+import timeit
+
+from oratools import csharp
+from oratools.decoder import OrderFields
+
+
+def _legacy_parse_fmt(data, fmt):
+    n = struct.calcsize(fmt)
+    return struct.unpack('<' + fmt, data[:n])
+
+
+def _legacy_parse_string(data):
+    length, nbytes = csharp._vlq_deserialize(data)
+    return data[nbytes:nbytes+length], nbytes + length
+
+
+def _legacy_from_data(data):
+    # Subset of the original OrderFields.from_data() (orders_version 11)
+    # covering the CreateGroup code path
+    field, field_size = _legacy_parse_string(data)
+    data = data[field_size:]
+    info = {}
+    flags, = _legacy_parse_fmt(data, 'h')
+    data = data[2:]
+    if flags & OrderFields._FLAG_SUBJECT:
+        info['subject_id'], = _legacy_parse_fmt(data, 'I')
+        data = data[4:]
+    if flags & OrderFields._FLAG_EXTRAACTORS:
+        count, = _legacy_parse_fmt(data, 'i')
+        data = data[4:]
+        info['extra_actors'] = _legacy_parse_fmt(data, 'I' * count)
+        data = data[4 * count:]
+    if flags & OrderFields._FLAG_GROUPED:
+        count, = _legacy_parse_fmt(data, 'i')
+        data = data[4:]
+        info['grouped_actors'] = _legacy_parse_fmt(data, 'I' * count)
+        data = data[4 * count:]
+    return field, info
+
+
+def _create_group_order(nb_actors):
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_EXTRAACTORS | OrderFields._FLAG_GROUPED
+    actors = struct.pack(f'<i{nb_actors}I', nb_actors, *range(nb_actors))
+    return csharp.serialize_string(b'CreateGroup') + struct.pack('<hI', flags, 4) + actors + actors
+
+
+def _best_times(funcs, number, repeat):
+    '''Best time per call of every function, timed alternately so that they
+    are all equally affected by the load variations of the system'''
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            best[i] = min(best[i], timeit.timeit(func, number=number) / number)
+    return best
+
+
+def run():
+    print(f'{"actors":>8} {"legacy (µs)":>12} {"cursor (µs)":>12} {"speedup":>8}')
+    for nb_actors in (5, 50, 500, 5000):
+        data = _create_group_order(nb_actors)
+        order = OrderFields.from_data(data, None, 11)
+        assert _legacy_from_data(data) == (order.field, order.info)
+
+        number = max(20000 // nb_actors, 20)
+        legacy, cursor = _best_times([lambda: _legacy_from_data(data), lambda: OrderFields.from_data(data, None, 11)],
+                                     number, 50)
+        print(f'{nb_actors:>8} {legacy * 1e6:>12.2f} {cursor * 1e6:>12.2f} {legacy / cursor:>7.2f}x')
+
+
+if __name__ == '__main__':
+    run()
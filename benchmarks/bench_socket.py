@@ -0,0 +1,74 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''Live packets reading benchmark: buffered recv_into() reader vs the
+historical per-packet recv() reader, over a local socket pair'''
+
+import socket
+import struct
+import threading
+import time
+
+from oratools.network import SocketReader
+from oratools.packet import Packet
+
+
+class _LegacySocketReader:
+
+    def __init__(self, socket):
+        self._socket = socket
+
+    def read(self, n):
+        buf = b''
+        while True:
+            data = self._socket.recv(n)
+            if not data:
+                raise Exception(f'Unexpected EOF after reading {len(buf)}/{n+len(buf)}')
+            buf += data
+            n -= len(data)
+            if n == 0:
+                break
+        return buf
+
+
+def _bench(get_reader, stream, nb_packets):
+    server, client = socket.socketpair()
+    sender = threading.Thread(target=lambda: (server.sendall(stream), server.close()))
+    t0 = time.perf_counter()
+    sender.start()
+    reader = get_reader(client)
+    for _ in range(nb_packets):
+        Packet.from_socket(reader)
+    t = time.perf_counter() - t0
+    sender.join()
+    client.close()
+    return t
+
+
+def run():
+    print(f'{"size":>6} {"legacy (µs)":>12} {"buffered (µs)":>14} {"speedup":>8}')
+    nb_packets = 50000
+    for size in (8, 64, 512, 4096):
+        packet = struct.pack('<iii', size + 4, 1, 0) + bytes(size)
+        stream = packet * nb_packets
+        legacy = min(_bench(_LegacySocketReader, stream, nb_packets) for _ in range(3)) / nb_packets
+        buffered = min(_bench(SocketReader, stream, nb_packets) for _ in range(3)) / nb_packets
+        print(f'{size:>6} {legacy * 1e6:>12.2f} {buffered * 1e6:>14.2f} {legacy / buffered:>7.2f}x')
+
+
+if __name__ == '__main__':
+    run()
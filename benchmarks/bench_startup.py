@@ -0,0 +1,57 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''Startup benchmark: cumulative import time of the CLI and of every
+subcommand module, measured with python -X importtime'''
+
+import subprocess
+import sys
+
+
+_MODULES = (
+    'oratools.cli',
+    'oratools.analyze',
+    'oratools.buildorder',
+    'oratools.chat',
+    'oratools.info',
+    'oratools.trace',
+    'oratools.mappack',
+)
+
+
+def _import_time(module):
+    '''Cumulative import time of module in µs'''
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, check=True)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == module:
+            return int(cumulative)
+    raise Exception(f'{module} not found in import times')
+
+
+def run(repeat=5):
+    print(f'{"module":>20} {"import (ms)":>12}')
+    for module in _MODULES:
+        best = min(_import_time(module) for _ in range(repeat))
+        print(f'{module:>20} {best / 1000:>12.2f}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,150 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os.path as op
+from array import array
+
+import numpy as np
+
+from . import pipeline
+
+
+# Fields orders which are not player actions
+_NON_ACTIONS = {
+    b'SyncInfo', b'SyncLobbyClients', b'SyncLobbySlots', b'SyncLobbyGlobalSettings', b'SyncClientPings',
+    b'Chat', b'Message', b'Command', b'PauseGame', b'StartGame',
+}
+
+
+class ActivityAnalyzer(pipeline.Analyzer):
+    '''Actions of every client, binned in time slots, by order type and
+    selection group creations'''
+
+    NAME = 'activity'
+    ORDERS_FILTER = {'Fields'}
+    OPTIONS = ('bin_size',)
+
+    def __init__(self, decoder, args=None):
+        super().__init__(decoder, args)
+        self._bin_size = getattr(args, 'bin_size', None) or 60
+        self._fields = {}
+        self._clients = array('i')
+        self._frames = array('i')
+        self._codes = array('i')
+
+    def feed(self, pkt, order):
+        field = order.field
+        if field in _NON_ACTIONS:
+            return
+        code = self._fields.get(field)
+        if code is None:
+            code = self._fields[field] = len(self._fields)
+        self._clients.append(pkt.client)
+        self._frames.append(pkt.frame)
+        self._codes.append(code)
+
+    def get_result(self):
+        dec = self._dec
+        fields = [field.decode() for field in self._fields]
+        if not self._frames:
+            return dict(bin_size=self._bin_size, duration_ms=0, fields=fields, clients=[])
+
+        clients = np.frombuffer(self._clients, dtype=np.intc)
+        codes = np.frombuffer(self._codes, dtype=np.intc)
+        frames = np.frombuffer(self._frames, dtype=np.intc).astype(np.int64)
+
+        # Same time conversion as Decoder.get_frame_time(), on all the frames
+        # at once
+        ms = dec.get_tick_ms(dec.get_frame_tick(frames))
+        bins = ms // (self._bin_size * 1000)
+        nb_bins = int(bins.max()) + 1
+
+        client_ids, client_index = np.unique(clients, return_inverse=True)
+        nb_clients = len(client_ids)
+        slots = client_index * nb_bins + bins
+        actions = np.bincount(slots, minlength=nb_clients * nb_bins).reshape(nb_clients, nb_bins)
+        mix = np.bincount(client_index * len(fields) + codes, minlength=nb_clients * len(fields))
+        mix = mix.reshape(nb_clients, len(fields))
+        create_group = np.zeros((nb_clients, nb_bins), dtype=np.int64)
+        if b'CreateGroup' in self._fields:
+            selected = codes == self._fields[b'CreateGroup']
+            create_group = np.bincount(slots[selected], minlength=nb_clients * nb_bins).reshape(nb_clients, nb_bins)
+
+        names = dec.get_client_names()
+        return dict(
+            bin_size=self._bin_size,
+            duration_ms=int(ms.max()),
+            fields=fields,
+            clients=[
+                dict(client=int(client), name=names.get(int(client), f'#{client}'), actions=actions[i].tolist(),
+                     create_group=create_group[i].tolist(), mix=mix[i].tolist())
+                for i, client in enumerate(client_ids)
+            ],
+        )
+
+    @staticmethod
+    def render(result):
+        if not result['clients']:
+            return
+        fields = result['fields']
+        minutes = max(result['duration_ms'], 1) / 60000
+        to_apm = 60 / result['bin_size']
+        name_padding = max(len(client['name']) for client in result['clients'])
+        logging.info(f'  {"name":<{name_padding}} {"actions":>8} {"APM":>6} {"peak":>6} {"groups":>7}  top orders')
+        for client in result['clients']:
+            total = sum(client['actions'])
+            peak = max(client['actions']) * to_apm
+            mix = sorted(zip(client['mix'], fields), reverse=True)[:3]
+            top = ' '.join(f'{field}:{count * 100 / total:.0f}%' for count, field in mix if count)
+            logging.info(f'  {client["name"]:<{name_padding}} {total:>8} {total / minutes:>6.1f} {peak:>6.1f} '
+                         f'{sum(client["create_group"]):>7}  {top}')
+
+    @staticmethod
+    def get_json_entries(result):
+        to_apm = 60 / result['bin_size']
+        for client in result['clients']:
+            yield dict(type='activity', name=client['name'], bin_size=result['bin_size'],
+                       apm=[count * to_apm for count in client['actions']],
+                       create_group=client['create_group'],
+                       mix={field: count for field, count in zip(result['fields'], client['mix']) if count})
+
+
+def _save(filename, result, out_dir):
+    clients = result['clients']
+    path = op.join(out_dir, op.splitext(op.basename(filename))[0] + '.activity.npz')
+    np.savez_compressed(
+        path,
+        bin_size=result['bin_size'],
+        clients=np.array([client['client'] for client in clients], dtype=np.int32),
+        names=np.array([client['name'] for client in clients]),
+        fields=np.array(result['fields']),
+        actions=np.array([client['actions'] for client in clients], dtype=np.int32).reshape(len(clients), -1),
+        create_group=np.array([client['create_group'] for client in clients], dtype=np.int32).reshape(len(clients), -1),
+        mix=np.array([client['mix'] for client in clients], dtype=np.int32).reshape(len(clients), -1),
+    )
+    logging.info(f'  Saved {path}')
+
+
+def activity(filename, args):
+    if args.out_dir is None:
+        pipeline.run(filename, args, [ActivityAnalyzer])
+        return
+    result = pipeline.get_results(filename, args, [ActivityAnalyzer])
+    if result['error'] is not None:
+        logging.error(result['error'])
+    _save(filename, result['results'][ActivityAnalyzer.NAME], args.out_dir)
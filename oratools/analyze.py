@@ -0,0 +1,35 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from . import pipeline
+from .buildorder import BuildOrderAnalyzer
+from .chat import ChatAnalyzer
+from .stats import StatsAnalyzer
+
+
+ANALYZERS = {
+    'chat': ChatAnalyzer,
+    'buildorder': BuildOrderAnalyzer,
+    'stats': StatsAnalyzer,
+}
+
+
+def analyze(filename, args):
+    analyzer_classes = [cls for name, cls in ANALYZERS.items() if getattr(args, name)]
+    if not analyzer_classes:
+        analyzer_classes = list(ANALYZERS.values())
+    pipeline.run(filename, args, analyzer_classes)
@@ -18,14 +18,62 @@
 import struct
 
 
+_structs = {}
+
+
+def get_struct(fmt):
+    '''Precompiled little-endian struct for fmt'''
+    st = _structs.get(fmt)
+    if st is None:
+        st = _structs[fmt] = struct.Struct('<' + fmt)
+    return st
+
+
 def parse_fmt(data, fmt):
-    n = struct.calcsize(fmt)
-    return struct.unpack('<' + fmt, data[:n])
+    return get_struct(fmt).unpack_from(data)
 
 
 def read_data_fmt(reader, fmt):
-    n = struct.calcsize(fmt)
+    st = get_struct(fmt)
+    n = st.size
     data = reader.read(n)
     if len(data) != n:
         raise ValueError(f'Read only {len(data)} bytes out of {n} requested')
-    return parse_fmt(data, fmt)
+    return st.unpack(data)
+
+
+class Cursor:
+    '''Sequential reader over a bytes-like object, tracking an offset
+    instead of re-slicing (and thus copying) the remaining data'''
+
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.data) - self.offset
+
+    def read_struct(self, st):
+        values = st.unpack_from(self.data, self.offset)
+        self.offset += st.size
+        return values
+
+    def read_fmt(self, fmt):
+        return self.read_struct(get_struct(fmt))
+
+    def read_u8(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def read_array(self, fmt, count):
+        return self.read_struct(get_struct(f'{count}{fmt}'))
+
+    def read_bytes(self, n):
+        end = self.offset + n
+        data = self.data[self.offset:end]
+        self.offset = end
+        return data
+
+    def skip(self, n):
+        self.offset += n
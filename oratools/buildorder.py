@@ -15,80 +15,176 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
 import logging
 
-from .decoder import Decoder
-from .demuxer import FileDemuxer
+from . import pipeline
+from .decoder import format_ms
 
 
-def _find_target_in_queue(queue, target):
-    for i, item in enumerate(queue):
-        qframe, qtarget, qcount = item
-        if qtarget == target:
-            return i
-    #logging.warning(f'anomaly detected: can not find target {target} in {queue}')
-    return -1
+# Production queue of the Red Alert units, the others targets (buildings and
+# defenses) being produced in the building queues; the orders do not carry
+# the queue so it has to be guessed from the target
+_QUEUE_TARGETS = {
+    'Infantry': {b'dog', b'e1', b'e2', b'e3', b'e4', b'e6', b'e7', b'medi', b'mech', b'spy', b'thf', b'shok'},
+    'Vehicle': {b'harv', b'mcv', b'1tnk', b'2tnk', b'3tnk', b'4tnk', b'apc', b'arty', b'jeep', b'v2rl', b'mnly',
+                b'truk', b'ttnk', b'ftrk', b'dtrk', b'ctnk', b'qtnk', b'stnk', b'mgg', b'mrj'},
+    'Aircraft': {b'heli', b'hind', b'mh60', b'tran', b'yak', b'mig'},
+    'Ship': {b'ss', b'msub', b'dd', b'ca', b'pt', b'lst'},
+}
+_TARGET_QUEUES = {target: queue for queue, targets in _QUEUE_TARGETS.items() for target in targets}
 
 
-def _remove_queue_items(queue, target, count):
-    i = _find_target_in_queue(queue, target)
-    if i == -1:
-        return
-    qframe, qtarget, qcount = queue[i]
-    remain = qcount - count
-    if remain <= 0:
-        queue.pop(i)
-        if remain:
-            #logging.info(f'[{target}] {qcount=} {count=} -> {remain=}')
-            _remove_queue_items(queue, target, -remain)
-    else:
-        queue[i] = (qframe, qtarget, qcount - count)
+def get_queue_name(target):
+    return _TARGET_QUEUES.get(target, 'Building')
+
+
+class ProductionQueue:
+    '''Production queue indexed by target: every target has its own FIFO of
+    [start_frame, count] items, so that the items of a target are found and
+    removed without scanning the whole queue'''
+
+    def __init__(self):
+        self._items = {}
+
+    def start(self, frame, target, count):
+        fifo = self._items.get(target)
+        if fifo is None:
+            fifo = self._items[target] = collections.deque()
+        fifo.append([frame, count])
+
+    def complete(self, target):
+        '''Remove one item of target and return the frame at which its
+        production started (None if the target is not queued)'''
+        fifo = self._items.get(target)
+        if not fifo:
+            #logging.warning(f'anomaly detected: can not find target {target} in queue')
+            return None
+        start_frame = fifo[0][0]
+        self._remove(fifo, 1)
+        return start_frame
+
+    def cancel(self, target, count):
+        fifo = self._items.get(target)
+        if fifo:
+            self._remove(fifo, count)
+
+    @staticmethod
+    def _remove(fifo, count):
+        # Removing more than the count of the oldest item continues with the
+        # next items of the same target
+        while fifo:
+            item = fifo[0]
+            remain = item[1] - count
+            if remain > 0:
+                item[1] = remain
+                return
+            fifo.popleft()
+            if not remain:
+                return
+            count = -remain
+
+    def get_items(self):
+        '''Queued (start_frame, target, count) items, in production order'''
+        items = [(frame, target, count) for target, fifo in self._items.items() for frame, count in fifo]
+        return sorted(items, key=lambda item: item[0])
+
+
+class ClientQueues:
+    '''Production queues (Building, Infantry, Vehicle, ...) of a client'''
+
+    def __init__(self):
+        self.queues = {}
+
+    def get(self, target):
+        name = get_queue_name(target)
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.queues[name] = ProductionQueue()
+        return queue
+
+
+class BuildOrderAnalyzer(pipeline.Analyzer):
+
+    NAME = 'buildorder'
+    ORDERS_FILTER = {b'StartProduction', b'PlaceBuilding', b'CancelProduction'}
+    OPTIONS = ('max_steps',)
+
+    def __init__(self, decoder, args=None):
+        super().__init__(decoder, args)
+        self._builds = {}
+        self._queues = {}
+
+        # Only the first max_steps builds of every player are needed: the
+        # analysis is done as soon as all of them are reached
+        self._max_steps = getattr(args, 'max_steps', None)
+        self._pending_players = set()
+        if self._max_steps is not None:
+            for key, player in decoder.get_game_info().items():
+                if key.startswith('Player@') and 'ClientIndex' in player:
+                    self._pending_players.add(int(player['ClientIndex']))
+
+    def _get_client_queues(self, client):
+        client_queues = self._queues.get(client)
+        if client_queues is None:
+            client_queues = self._queues[client] = ClientQueues()
+        return client_queues
+
+    def feed(self, pkt, order):
+        target = order.info['target']
+        queue = self._get_client_queues(pkt.client).get(target)
+        if order.field == b'StartProduction':
+            #logging.info(f'{pkt.client} start {order.info} q:{queue.get_items()}')
+            queue.start(pkt.frame, target, order.info['extra_data'])
+        elif order.field == b'PlaceBuilding':
+            #logging.info(f'{pkt.client} place {order.info} q:{queue.get_items()}')
+            build = self._builds.get(pkt.client, [])
+            if self._max_steps is not None and len(build) >= self._max_steps:
+                return
+            start_frame = queue.complete(target)
+            if start_frame is None:
+                return
+            build.append((start_frame, pkt.frame, target))
+            self._builds[pkt.client] = build
+            if self._max_steps is not None and len(build) == self._max_steps:
+                self._pending_players.discard(pkt.client)
+                self.done = not self._pending_players
+        elif order.field == b'CancelProduction':
+            #logging.info(f'{pkt.client} cancel {order.info} q:{queue.get_items()}')
+            queue.cancel(target, order.info['extra_data'])
+
+    def get_result(self):
+        # The frames are kept raw, along with the duration of a frame to
+        # format them
+        dec = self._dec
+        names = dec.get_client_names()
+        return dict(
+            frame_ms=dec.get_tick_ms(dec.get_frame_tick(1)),
+            builds=[
+                dict(client=client, name=names.get(client, f'#{client}'), steps=[
+                    (start_frame, end_frame, struct.decode(), get_queue_name(struct))
+                    for start_frame, end_frame, struct in build
+                ])
+                for client, build in self._builds.items()
+            ],
+        )
+
+    @staticmethod
+    def render(result):
+        frame_ms = result['frame_ms']
+        for build in result['builds']:
+            logging.info(f'{build["name"]}:')
+            for start_frame, end_frame, struct, _ in build['steps']:
+                logging.info(f'  {format_ms(start_frame * frame_ms)} → {format_ms(end_frame * frame_ms)}: {struct}')
+
+    @staticmethod
+    def get_json_entries(result):
+        frame_ms = result['frame_ms']
+        for build in result['builds']:
+            for start_frame, end_frame, struct, queue in build['steps']:
+                yield dict(type='build', name=build['name'], start=format_ms(start_frame * frame_ms),
+                           end=format_ms(end_frame * frame_ms), target=struct, queue=queue)
 
 
 def buildorder(filename, args):
-    with open(filename, 'rb') as f:
-
-        builds = {}
-        queues = {}
-
-        fmt = FileDemuxer(f, args.forced_version)
-        dec = Decoder(fmt.game_info)
-        for pkt in fmt.read_packet():
-            for order in dec.decode_packet(pkt):
-                if order.type != 'Fields':
-                    continue
-                if order.field == b'StartProduction':
-                    queue = queues.get(pkt.client, [])
-                    #logging.info(f'{pkt.client} start {order.info} q:{queue}')
-                    target = order.info['target']
-                    count = order.info['extra_data']
-                    queue.append((pkt.frame, target, count))
-                    queues[pkt.client] = queue
-                elif order.field == b'PlaceBuilding':
-                    queue = queues[pkt.client]
-                    #logging.info(f'{pkt.client} place {order.info} q:{queue}')
-                    target = order.info['target']
-
-                    i = _find_target_in_queue(queue, target)
-                    if i == -1:
-                        continue
-                    start_frame, qtarget, qcount = queue[i]
-                    _remove_queue_items(queue, target, 1)
-
-                    b = builds.get(pkt.client, [])
-                    b.append((start_frame, pkt.frame, target))
-                    builds[pkt.client] = b
-                elif order.field == b'CancelProduction':
-                    queue = queues[pkt.client]
-                    #logging.info(f'{pkt.client} cancel {order.info} q:{queue}')
-                    target = order.info['target']
-                    count = order.info['extra_data']
-                    _remove_queue_items(queue, target, count)
-
-        for client, build in builds.items():
-            name = dec.get_name(client)
-            logging.info(f'{name}:')
-            for start_frame, end_frame, struct in build:
-                t0 = dec.get_frame_time(start_frame)
-                t1 = dec.get_frame_time(end_frame)
-                logging.info(f'  {t0} → {t1}: {struct.decode()}')
+    pipeline.run(filename, args, [BuildOrderAnalyzer])
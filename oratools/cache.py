@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import json
+import logging
+import os
+import os.path as op
+import time
+
+
+def get_cache_dir(*subdirs):
+    base = os.environ.get('XDG_CACHE_HOME') or op.expanduser('~/.cache')
+    cache_dir = op.join(base, 'oratools', *subdirs)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+_tool_version = None
+
+
+def _get_tool_version():
+    '''Hash of the oratools sources, so that any code change invalidates the
+    cached results'''
+    global _tool_version
+    if _tool_version is None:
+        h = hashlib.sha1()
+        src_dir = op.dirname(__file__)
+        for name in sorted(os.listdir(src_dir)):
+            if not name.endswith('.py'):
+                continue
+            with open(op.join(src_dir, name), 'rb') as f:
+                h.update(f.read())
+        _tool_version = h.hexdigest()
+    return _tool_version
+
+
+def _get_replay_fingerprint(filename):
+    '''Identify a replay content from its size, mtime and footer (which
+    contains the game information) without reading it entirely'''
+    st = os.stat(filename)
+    h = hashlib.sha1(f'{st.st_size}:{st.st_mtime_ns}'.encode())
+    with open(filename, 'rb') as f:
+        f.seek(max(st.st_size - 4096, 0))
+        h.update(f.read())
+    return h.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, path, max_size):
+        import sqlite3
+
+        self._max_size = max_size
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            atime REAL NOT NULL
+        )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_atime ON results (atime)')
+
+    def close(self):
+        self._db.close()
+
+    def get(self, key):
+        row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute('UPDATE results SET atime = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        value = json.dumps(value, separators=(',', ':'))
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+            self._evict()
+
+    def _evict(self):
+        total_size, = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()
+        if total_size <= self._max_size:
+            return
+        # Drop the least recently used results until we are within 90% of
+        # the maximum size, to avoid evicting on every insertion
+        excess = total_size - self._max_size * 9 // 10
+        rows = self._db.execute('SELECT key, size FROM results ORDER BY atime')
+        evicted = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        self._db.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+
+class ScanState:
+    '''Size and mtime of the files successfully processed by a command in
+    the previous runs'''
+
+    _COMMIT_INTERVAL = 256
+
+    def __init__(self, name):
+        import sqlite3
+
+        self._name = name
+        self._db = sqlite3.connect(op.join(get_cache_dir(), 'scan.sqlite'), timeout=60)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS files (
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            PRIMARY KEY (name, path)
+        )''')
+        rows = self._db.execute('SELECT path, size, mtime_ns FROM files WHERE name = ?', (name,))
+        self._known = {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+        self._pending = {}
+        self._nb_uncommitted = 0
+
+    def filter_changed(self, filenames):
+        # Only works on the in-memory state, so it can be consumed from
+        # another thread (such as the task feeder of a process pool)
+        # The same replay may be reached several times through the targets
+        # (a file and its directory for example): it is only processed once
+        seen = set()
+        for filename in filenames:
+            path = op.abspath(filename)
+            if path in seen:
+                continue
+            seen.add(path)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                logging.error('unable to read %s', filename)
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            if self._known.get(path) == state:
+                continue
+            self._pending[filename] = (path, state)
+            yield filename
+
+    def mark_done(self, filename):
+        path, (size, mtime_ns) = self._pending.pop(filename)
+        self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (self._name, path, size, mtime_ns))
+        self._nb_uncommitted += 1
+        if self._nb_uncommitted == self._COMMIT_INTERVAL:
+            self._db.commit()
+            self._nb_uncommitted = 0
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+_result_cache = None
+
+
+def get_result(filename, args, name, compute, options=()):
+    '''Return the (JSON serializable) result of compute(filename, args),
+    cached by replay content, tool version, analysis name and options (the
+    common ones and the specified ones)'''
+    global _result_cache
+    if args.no_cache:
+        return compute(filename, args)
+
+    if _result_cache is None:
+        path = op.join(get_cache_dir(), 'results.sqlite')
+        _result_cache = ResultCache(path, args.cache_size * 1024 * 1024)
+
+    options = [getattr(args, opt, None) for opt in ('forced_version', 'start', 'until', *options)]
+    key_data = json.dumps([_get_tool_version(), name, options, _get_replay_fingerprint(filename)])
+    key = hashlib.sha1(key_data.encode()).hexdigest()
+
+    result = _result_cache.get(key)
+    if result is None:
+        result = compute(filename, args)
+        _result_cache.put(key, result)
+    return result
@@ -17,34 +17,40 @@
 
 import logging
 
-from .decoder import Decoder
-from .demuxer import FileDemuxer
+from . import pipeline
 
 
-def chat(filename, args):
-    with open(filename, 'rb') as f:
-        fmt = FileDemuxer(f, args.forced_version)
-        dec = Decoder(fmt.game_info)
-        dialogues = []
-        try:
-            for pkt in fmt.read_packet():
-                for order in dec.decode_packet(pkt):
-                    if order.type == 'Handshake' and order.key == b'Chat':  # older version
-                        dialog = order.value.decode()
-                        source = 'global'  # probably inaccurate
-                    elif order.type == 'Fields' and order.field == b'Chat':
-                        dialog = order.info['target'].decode()
-                        source = 'global' if order.info.get('extra_data') is None else 'team'
-                    elif order.type == 'Fields' and order.field == b'Message':
-                        dialog = order.info['target'].decode()
-                        source = 'server'
-                    else:
-                        continue
-                    name = dec.get_name(pkt.client) if source != 'server' else None
-                    dialogues.append((name, source, dialog))
-        except ValueError as e:
-            logging.error(e)
+class ChatAnalyzer(pipeline.Analyzer):
+
+    NAME = 'chat'
+    ORDERS_FILTER = {'Handshake', b'Chat', b'Message'}
+
+    def __init__(self, decoder, args=None):
+        super().__init__(decoder, args)
+        self._dialogues = []
+
+    def feed(self, pkt, order):
+        if order.type == 'Handshake' and order.key == b'Chat':  # older version
+            dialog = order.value.decode()
+            source = 'global'  # probably inaccurate
+        elif order.type == 'Fields' and order.field == b'Chat':
+            dialog = order.info['target'].decode()
+            source = 'global' if order.info.get('extra_data') is None else 'team'
+        elif order.type == 'Fields' and order.field == b'Message':
+            dialog = order.info['target'].decode()
+            source = 'server'
+        else:
+            return
+        name = None
+        if source != 'server':
+            name = self._dec.get_client_names().get(pkt.client, f'#{pkt.client}')
+        self._dialogues.append((name, source, dialog))
+
+    def get_result(self):
+        return self._dialogues
 
+    @staticmethod
+    def render(dialogues):
         if not dialogues:
             return
 
@@ -54,3 +60,12 @@ def chat(filename, args):
             prefix = f'[{source}]'
             name = f'<{name}>' if name is not None else ''
             logging.info(f'{prefix.ljust(source_padding+2)} {name.rjust(name_padding+2)}  {dialog}')
+
+    @staticmethod
+    def get_json_entries(dialogues):
+        for name, source, dialog in dialogues:
+            yield dict(type='chat', name=name, source=source, dialog=dialog)
+
+
+def chat(filename, args):
+    pipeline.run(filename, args, [ChatAnalyzer])
@@ -18,57 +18,319 @@
 import os
 import os.path as op
 import argparse
+import importlib
+import io
 import logging
 
-from .buildorder import buildorder
-from .chat import chat
-from .trace import trace
-from .mappack import mappack
+# Subcommand modules (and their dependencies) are only imported when the
+# subcommand runs, in order to keep the startup time low
+_ANALYSES = ('chat', 'buildorder', 'stats')
 
 
-def _get_next_filename(targets):
+def _scan_dir(dirname, ext):
+    try:
+        with os.scandir(dirname) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        logging.error('unable to scan %s', dirname)
+        return
+    for entry in entries:
+        # The file type is known from the directory listing, so no file is
+        # stat'ed nor opened here
+        if entry.is_dir():
+            if not entry.is_symlink():
+                yield from _scan_dir(entry.path, ext)
+        elif ext is None or entry.name.endswith(ext):
+            yield entry.path
+
+
+def _get_next_filename(targets, ext=None):
+    '''Stream the files specified by targets; files found in directories
+    are filtered by extension (if ext is set)'''
     for filename in sorted(targets):
         if op.isdir(filename):
-            for root, dirs, files in os.walk(filename):
-                for name in files:
-                    yield op.join(root, name)
+            yield from _scan_dir(filename, ext)
         else:
             yield filename
 
 
+def _run_replay(fn, replay, args):
+    logging.info(f'Replay: {replay}')
+    try:
+        fn(replay, args)
+    except:
+        logging.error('unable to read %s', replay)
+        return False
+    return True
+
+
+def _run_replay_buffered(job):
+    from . import jsonl, logutils
+
+    fn, replay, args = job
+    handler = logutils.buffer_logs()
+    output = io.BytesIO()
+    jsonl.set_writer(jsonl.JsonlWriter(output))
+    ok = _run_replay(fn, replay, args)
+    return replay, ok, handler.records, output.getvalue()
+
+
 def _replay_opt(fn, args):
-    for replay in _get_next_filename(args.replay):
-        logging.info(f'Replay: {replay}')
-        try:
-            fn(replay, args)
-        except:
-            logging.error('unable to read %s', replay)
+    replays = _get_next_filename(args.replay, '.orarep')
+    scan_state = None
+    if args.changed_only:
+        from .cache import ScanState
+
+        scan_state = ScanState(f'{fn.__module__}.{fn.__name__}')
+        replays = scan_state.filter_changed(replays)
+
+    try:
+        _run_replays(fn, replays, args, scan_state)
+    finally:
+        if scan_state is not None:
+            scan_state.close()
+
+
+def _run_replays(fn, replays, args, scan_state):
+    if args.jobs == 1:
+        for replay in replays:
+            ok = _run_replay(fn, replay, args)
+            if ok and scan_state is not None:
+                scan_state.mark_done(replay)
+        return
+
+    # The log output of every replay is buffered in the workers and emitted
+    # in the original replays order. The func callback is not picklable and
+    # not needed by the workers.
+    import multiprocessing
+
+    from . import logutils
+
+    job_args = argparse.Namespace(**{k: v for k, v in vars(args).items() if k != 'func'})
+    jobs = ((fn, replay, job_args) for replay in replays)
+    with multiprocessing.Pool(args.jobs or None) as pool:
+        for replay, ok, records, output in pool.imap(_run_replay_buffered, jobs):
+            logutils.emit_records(records)
+            if output:
+                from . import jsonl
+
+                jsonl.get_writer().write_raw(output)
+            if ok and scan_state is not None:
+                scan_state.mark_done(replay)
+
+
+def _add_jobs_opt(parser):
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs (0 to use all the cores)')
+
+
+def _add_changed_opt(parser):
+    parser.add_argument('--changed-only', action='store_true', default=False,
+                        help='Skip the replays unchanged (size and mtime) since they were last processed successfully')
+
+
+def _add_cache_opts(parser):
+    parser.add_argument('--no-cache', action='store_true', default=False, help='Do not use nor update the results cache')
+    parser.add_argument('--cache-size', type=int, default=256, help='Maximum size of the results cache in MiB')
+
+
+def _add_format_opt(parser):
+    parser.add_argument('--format', choices=('text', 'jsonl'), default='text',
+                        help='Output format; jsonl writes one JSON object per line on the standard output')
+
+
+def _frame_time(value):
+    from .decoder import parse_frame_time
+
+    try:
+        parse_frame_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _add_range_opts(parser):
+    parser.add_argument('--from', dest='start', type=_frame_time,
+                        help='Start frame (such as 1234) or timestamp ([HH:]MM:SS[.mmm] or SS[.mmm]s)')
+    parser.add_argument('--until', type=_frame_time,
+                        help='End frame (such as 1234) or timestamp ([HH:]MM:SS[.mmm] or SS[.mmm]s)')
+
+
+def _add_steps_opt(parser):
+    parser.add_argument('--max-steps', type=int,
+                        help='Only extract the first build steps of every player, stopping the replay reading once they are reached')
+
+
+def _replay_cmd(name):
+    def run_cmd(args):
+        module = importlib.import_module(f'.{name}', __package__)
+        _replay_opt(getattr(module, name), args)
+    return run_cmd
+
+
+def _export(args):
+    from .export import export
+
+    export(_get_next_filename(args.replay, '.orarep'), args)
+
+
+def _index(args):
+    from .corpus import index
+
+    index(_get_next_filename(args.replay, '.orarep'), args)
+
+
+def _openings(args):
+    from .openings import openings
+
+    openings(_get_next_filename(args.replay, '.orarep'), args)
+
+
+def _query(args):
+    from .corpus import query
+
+    query(args)
+
+
+def _record(args):
+    from .recorder import recorder
+
+    recorder(args)
+
+
+def _serve(args):
+    from .serve import serve
+
+    serve(_get_next_filename(args.replay, '.orarep'), args)
 
 
 def _mappack(args):
-    args.maps = [m for m in _get_next_filename(args.maps) if m.endswith('.oramap')]
+    from .mappack import mappack
+
+    args.maps = [m for m in _get_next_filename(args.maps, '.oramap') if m.endswith('.oramap')]
     mappack(args)
 
 
 def run():
     parser = argparse.ArgumentParser()
     parser.add_argument('--forced-version', help='Force a version, useful to trace an invalid/truncated replay')
+    parser.add_argument('--mmap', action='store_true', default=False, help='Memory-map the replays instead of reading them packet by packet')
     parser.set_defaults(func=None)
 
     subparsers = parser.add_subparsers()
 
     chat_p = subparsers.add_parser('chat')
+    _add_range_opts(chat_p)
+    _add_format_opt(chat_p)
+    _add_cache_opts(chat_p)
+    _add_jobs_opt(chat_p)
+    _add_changed_opt(chat_p)
     chat_p.add_argument('replay', nargs='+')
-    chat_p.set_defaults(func=lambda args: _replay_opt(chat, args))
+    chat_p.set_defaults(func=_replay_cmd('chat'))
+
+    info_p = subparsers.add_parser('info')
+    _add_jobs_opt(info_p)
+    _add_changed_opt(info_p)
+    info_p.add_argument('replay', nargs='+')
+    info_p.set_defaults(func=_replay_cmd('info'))
 
     trace_p = subparsers.add_parser('trace')
     trace_p.add_argument('--filter', help='Orders filter')
+    _add_range_opts(trace_p)
+    _add_format_opt(trace_p)
+    _add_jobs_opt(trace_p)
+    _add_changed_opt(trace_p)
     trace_p.add_argument('replay', nargs='+')
-    trace_p.set_defaults(func=lambda args: _replay_opt(trace, args))
+    trace_p.set_defaults(func=_replay_cmd('trace'))
 
     buildorder_p = subparsers.add_parser('buildorder')
+    _add_steps_opt(buildorder_p)
+    _add_range_opts(buildorder_p)
+    _add_format_opt(buildorder_p)
+    _add_cache_opts(buildorder_p)
+    _add_jobs_opt(buildorder_p)
+    _add_changed_opt(buildorder_p)
     buildorder_p.add_argument('replay', nargs='+')
-    buildorder_p.set_defaults(func=lambda args: _replay_opt(buildorder, args))
+    buildorder_p.set_defaults(func=_replay_cmd('buildorder'))
+
+    activity_p = subparsers.add_parser('activity', help='Actions per minute, order types and selection groups of every client')
+    activity_p.add_argument('--bin-size', type=int, default=60, help='Time slot duration in seconds')
+    activity_p.add_argument('--out-dir', help='Save the time series into <replay>.activity.npz files in this directory')
+    _add_range_opts(activity_p)
+    _add_format_opt(activity_p)
+    _add_cache_opts(activity_p)
+    _add_jobs_opt(activity_p)
+    _add_changed_opt(activity_p)
+    activity_p.add_argument('replay', nargs='+')
+    activity_p.set_defaults(func=_replay_cmd('activity'))
+
+    desync_p = subparsers.add_parser('desync', help='Find the first frame where the clients game states diverge')
+    _add_range_opts(desync_p)
+    _add_format_opt(desync_p)
+    _add_cache_opts(desync_p)
+    _add_jobs_opt(desync_p)
+    _add_changed_opt(desync_p)
+    desync_p.add_argument('replay', nargs='+')
+    desync_p.set_defaults(func=_replay_cmd('desync'))
+
+    analyze_p = subparsers.add_parser('analyze', help='Run several analyses over a single pass of the replay(s)')
+    for name in _ANALYSES:
+        analyze_p.add_argument(f'--{name}', action='store_true', default=False, help=f'Run the {name} analysis')
+    _add_jobs_opt(analyze_p)
+    _add_changed_opt(analyze_p)
+    _add_steps_opt(analyze_p)
+    _add_range_opts(analyze_p)
+    _add_format_opt(analyze_p)
+    _add_cache_opts(analyze_p)
+    analyze_p.add_argument('replay', nargs='+')
+    analyze_p.set_defaults(func=_replay_cmd('analyze'))
+
+    export_p = subparsers.add_parser('export', help='Export the decoded orders into columnar .npy files')
+    export_p.add_argument('--out-dir', default='.', help='Output directory')
+    export_p.add_argument('--chunk-size', type=int, default=1 << 16, help='Number of orders buffered in memory')
+    export_p.add_argument('--filter', nargs='+', help='Order types and/or field names to export')
+    export_p.add_argument('replay', nargs='+')
+    export_p.set_defaults(func=_export)
+
+    index_p = subparsers.add_parser('index', help='Scan replays into the corpus database (only new or changed ones)')
+    index_p.add_argument('--db', help='Corpus database (defaults to the user cache directory)')
+    _add_cache_opts(index_p)
+    _add_jobs_opt(index_p)
+    index_p.add_argument('replay', nargs='+')
+    index_p.set_defaults(func=_index, start=None, until=None)
+
+    openings_p = subparsers.add_parser('openings', help='Aggregate the openings (first build steps) of the players across replays')
+    openings_p.add_argument('--steps', dest='max_steps', type=int, default=5, help='Number of build steps of an opening')
+    openings_p.add_argument('--top', type=int, default=20, help='Number of (most frequent) openings to display')
+    _add_format_opt(openings_p)
+    _add_cache_opts(openings_p)
+    _add_jobs_opt(openings_p)
+    openings_p.add_argument('replay', nargs='+')
+    openings_p.set_defaults(func=_openings, start=None, until=None)
+
+    query_p = subparsers.add_parser('query', help='Search games in the corpus database (SQL LIKE patterns)')
+    query_p.add_argument('--db', help='Corpus database (defaults to the user cache directory)')
+    query_p.add_argument('--player', action='append', help='Player name (can be specified several times)')
+    query_p.add_argument('--map', help='Map title')
+    query_p.add_argument('--version', help='Game version')
+    query_p.add_argument('--chat', help='Text in the chat')
+    query_p.set_defaults(func=_query)
+
+    record_p = subparsers.add_parser('record', help='Record a live game into a replay file')
+    record_p.add_argument('--version', required=True, help='Game version (the live stream does not contain it)')
+    record_p.add_argument('--timeout', type=float, help='Connection and packets timeout in seconds')
+    record_p.add_argument('--listen', type=int, help='Forward the live stream to the clients connecting to this local port')
+    record_p.add_argument('--chat', action='store_true', default=False, help='Display the chat while recording')
+    record_p.add_argument('server')
+    record_p.add_argument('port', type=int)
+    record_p.add_argument('output')
+    record_p.set_defaults(func=_record)
+
+    serve_p = subparsers.add_parser('serve', help='Play back replays over TCP to the connecting clients, as a game server would')
+    serve_p.add_argument('--host', default='localhost', help='Listening address')
+    serve_p.add_argument('--port', type=int, default=1234, help='Listening port')
+    serve_p.add_argument('--speed', type=float, default=1, help='Playback speed factor (0 to send as fast as possible)')
+    serve_p.add_argument('replay', nargs='+')
+    serve_p.set_defaults(func=_serve)
 
     mappack_p = subparsers.add_parser('mappack')
     mappack_p.add_argument('--category', help='Set custom map category')
@@ -78,6 +340,7 @@ def run():
     mappack_p.add_argument('--ext', nargs='+', help='Extension to add (directory with an _extension.yaml file)')
     mappack_p.add_argument('--rm', nargs='+', help='Files to remove (also try to drop associated refs)')
     mappack_p.add_argument('--out-dir', default='.', help='Output directory')
+    mappack_p.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs (0 to use all the cores)')
     mappack_p.add_argument('maps', nargs='+')
     mappack_p.set_defaults(func=_mappack)
 
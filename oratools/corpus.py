@@ -0,0 +1,225 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import os.path as op
+import sqlite3
+
+from . import cache, pipeline
+from .buildorder import BuildOrderAnalyzer
+from .chat import ChatAnalyzer
+from .decoder import Decoder
+from .demuxer import FileDemuxer
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS replays (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    mod TEXT,
+    version TEXT,
+    map_title TEXT,
+    map_uid TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    duration TEXT,
+    final_tick INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    replay_id INTEGER NOT NULL REFERENCES replays(id) ON DELETE CASCADE,
+    client_index INTEGER,
+    name TEXT,
+    faction TEXT,
+    team TEXT,
+    outcome TEXT
+);
+CREATE TABLE IF NOT EXISTS clients (
+    replay_id INTEGER NOT NULL REFERENCES replays(id) ON DELETE CASCADE,
+    client_index INTEGER NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS chat (
+    replay_id INTEGER NOT NULL REFERENCES replays(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    name TEXT,
+    source TEXT,
+    dialog TEXT
+);
+CREATE TABLE IF NOT EXISTS builds (
+    replay_id INTEGER NOT NULL REFERENCES replays(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    name TEXT,
+    start TEXT,
+    end TEXT,
+    target TEXT
+);
+CREATE INDEX IF NOT EXISTS players_name ON players (name);
+CREATE INDEX IF NOT EXISTS players_replay ON players (replay_id);
+CREATE INDEX IF NOT EXISTS clients_replay ON clients (replay_id);
+CREATE INDEX IF NOT EXISTS chat_replay ON chat (replay_id);
+CREATE INDEX IF NOT EXISTS builds_replay ON builds (replay_id);
+CREATE INDEX IF NOT EXISTS replays_map ON replays (map_title);
+'''
+
+
+class ClientsAnalyzer(pipeline.Analyzer):
+    '''Client names, as known by the decoder at the end of the replay'''
+
+    NAME = 'clients'
+    ORDERS_FILTER = set()
+
+    def feed(self, pkt, order):
+        pass
+
+    def get_result(self):
+        return sorted(self._dec.get_client_names().items())
+
+
+_ANALYZERS = (ClientsAnalyzer, ChatAnalyzer, BuildOrderAnalyzer)
+
+
+def _get_db(args):
+    path = args.db or op.join(cache.get_cache_dir(), 'corpus.sqlite')
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    db.executescript(_SCHEMA)
+    return db
+
+
+def _get_replay_data(filename, args):
+    with open(filename, 'rb') as f:
+        game_info = FileDemuxer.read_game_info(f)
+    result = pipeline.get_results(filename, args, _ANALYZERS)
+    return game_info, result
+
+
+def _store_replay(db, filename, st, game_info, result):
+    root = game_info.get('Root', {})
+    final_tick = root.get('FinalGameTick')
+    dec = Decoder(game_info)
+    duration = dec.get_tick_time(int(final_tick)) if final_tick else None
+
+    db.execute('DELETE FROM replays WHERE path = ?', (filename,))
+    cursor = db.execute(
+        'INSERT INTO replays (path, size, mtime_ns, mod, version, map_title, map_uid, start_time, end_time, '
+        'duration, final_tick, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (filename, st.st_size, st.st_mtime_ns, root.get('Mod'), root.get('Version'), root.get('MapTitle'),
+         root.get('MapUid'), root.get('StartTimeUtc'), root.get('EndTimeUtc'), duration,
+         int(final_tick) if final_tick else None, result['error']))
+    replay_id = cursor.lastrowid
+
+    players = [
+        (replay_id, player.get('ClientIndex'), player.get('Name'), player.get('FactionName'),
+         player.get('Team'), player.get('Outcome'))
+        for key, player in game_info.items() if key.startswith('Player@')
+    ]
+    db.executemany('INSERT INTO players VALUES (?, ?, ?, ?, ?, ?)', players)
+
+    results = result['results']
+    db.executemany('INSERT INTO clients VALUES (?, ?, ?)',
+                   ((replay_id, client, name) for client, name in results['clients']))
+    db.executemany('INSERT INTO chat VALUES (?, ?, ?, ?, ?)',
+                   ((replay_id, seq, *dialogue) for seq, dialogue in enumerate(results['chat'])))
+    builds = [
+        (build['name'], dec.get_frame_time(start_frame), dec.get_frame_time(end_frame), target)
+        for build in results['buildorder']['builds'] for start_frame, end_frame, target, _ in build['steps']
+    ]
+    db.executemany('INSERT INTO builds VALUES (?, ?, ?, ?, ?, ?)',
+                   ((replay_id, seq, *build) for seq, build in enumerate(builds)))
+
+
+def _get_changed_replays(known, replays):
+    for filename in replays:
+        filename = op.abspath(filename)
+        try:
+            st = os.stat(filename)
+        except OSError:
+            logging.error('unable to read %s', filename)
+            continue
+        if known.get(filename) == (st.st_size, st.st_mtime_ns):
+            continue
+        yield filename, st
+
+
+def _index_job(job):
+    filename, st, args = job
+    try:
+        return filename, st, _get_replay_data(filename, args)
+    except Exception as e:
+        return filename, st, e
+
+
+def index(replays, args):
+    db = _get_db(args)
+    known = {path: (size, mtime_ns) for path, size, mtime_ns in db.execute('SELECT path, size, mtime_ns FROM replays')}
+    jobs = ((filename, st, args) for filename, st in _get_changed_replays(known, replays))
+
+    if args.jobs == 1:
+        _store_results(db, map(_index_job, jobs))
+    else:
+        import multiprocessing
+
+        with multiprocessing.Pool(args.jobs or None) as pool:
+            _store_results(db, pool.imap(_index_job, jobs))
+
+
+def _store_results(db, results):
+    nb_indexed = 0
+    for filename, st, data in results:
+        logging.info(f'Replay: {filename}')
+        if isinstance(data, Exception):
+            logging.error('unable to read %s', filename)
+            continue
+        with db:
+            _store_replay(db, filename, st, *data)
+        nb_indexed += 1
+    logging.info(f'{nb_indexed} replay(s) indexed')
+
+
+def query(args):
+    db = _get_db(args)
+
+    conditions = []
+    params = []
+    for player in args.player or []:
+        conditions.append('id IN (SELECT replay_id FROM players WHERE name LIKE ?)')
+        params.append(player)
+    if args.map:
+        conditions.append('map_title LIKE ?')
+        params.append(args.map)
+    if args.version:
+        conditions.append('version LIKE ?')
+        params.append(args.version)
+    if args.chat:
+        conditions.append('id IN (SELECT replay_id FROM chat WHERE dialog LIKE ?)')
+        params.append(f'%{args.chat}%')
+
+    sql = 'SELECT id, path, map_title, version, start_time, duration FROM replays'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY start_time, path'
+
+    for replay_id, path, map_title, version, start_time, duration in db.execute(sql, params).fetchall():
+        players = db.execute('SELECT name, outcome FROM players WHERE replay_id = ? ORDER BY client_index',
+                             (replay_id,)).fetchall()
+        players = ', '.join(f'{name} ({outcome})' if outcome else name for name, outcome in players)
+        logging.info(path)
+        logging.info(f'  {start_time} {map_title} [{version}] {duration}: {players}')
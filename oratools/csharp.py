@@ -15,10 +15,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-def _vlq_deserialize(data):
+from . import binutils
+
+
+def _vlq_deserialize(data, offset=0):
     n = nbytes = 0
-    for i, digit in enumerate(data):
-        n |= (digit & 0x7f) << (7 * i)
+    for i in range(offset, len(data)):
+        digit = data[i]
+        n |= (digit & 0x7f) << (7 * nbytes)
         nbytes += 1
         if not (digit & 0x80):
             break
@@ -36,10 +40,24 @@ def _vlq_serialize(n):
     return bytes(data)
 
 
+def read_string(cursor):
+    data, offset = cursor.data, cursor.offset
+    length = data[offset]
+    if length & 0x80:
+        length, nbytes = _vlq_deserialize(data, offset)
+        offset += nbytes
+    else:
+        # Single byte length, the common case
+        offset += 1
+    end = offset + length
+    cursor.offset = end
+    return bytes(data[offset:end])
+
+
 def parse_string(data):
-    length, nbytes = _vlq_deserialize(data)
-    string = data[nbytes:nbytes+length]
-    return string, nbytes + length
+    cursor = binutils.Cursor(data)
+    string = read_string(cursor)
+    return string, cursor.offset
 
 
 def serialize_string(s):
@@ -15,17 +15,69 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import pprint
+import functools
+import re
 
 from . import binutils, csharp, miniyaml
 from .packet import Packet
 
 
+@functools.lru_cache(maxsize=256)
+def _load_target_string(target_string):
+    # Lobby and handshake payloads are sent over and over with identical
+    # content, so the (immutable) parsing results are shared
+    return miniyaml.freeze(miniyaml.load(target_string))
+
+
+def target_string_cache_info():
+    return _load_target_string.cache_info()
+
+
+_FRAME_TIME_REGEX = re.compile(r'(?P<frame>\d+)|(?P<hms>(\d+:){1,2}\d+(\.\d+)?)|(?P<seconds>\d+(\.\d+)?)s')
+
+
+def parse_frame_time(frame_time):
+    '''Parse a frame id (such as 1234) or a timestamp, either [HH:]MM:SS[.mmm]
+    (such as 1:05.5) or SS[.mmm]s (such as 65.5s); return the frame id or the
+    number of seconds (the other being None)'''
+    match = _FRAME_TIME_REGEX.fullmatch(frame_time)
+    if match is None:
+        raise ValueError(f'Invalid frame or timestamp "{frame_time}"')
+    if match['frame'] is not None:
+        return int(frame_time), None
+    if match['seconds'] is not None:
+        return None, float(match['seconds'])
+    total_s = 0
+    for part in frame_time.split(':'):
+        total_s = total_s * 60 + float(part)
+    return None, total_s
+
+
+def format_ms(total_ms):
+    '''Format a duration in milliseconds as MM:SS.mmm'''
+    total_s = total_ms // 1000
+    total_m = total_s // 60
+    ms = total_ms % 1000
+    s = total_s % 60
+    m = total_m
+    return f'{m:02}:{s:02}.{ms:03}'
+
+
 class _Order:
 
+    __slots__ = ()
+
+    def __init_subclass__(cls):
+        if 'TYPE' not in cls.__dict__:
+            cls.TYPE = cls.__name__[len('Order'):]
+
     @property
     def type(self):
-        return self.__class__.__name__[len('Order'):]
+        return self.TYPE
+
+    @classmethod
+    def from_data(cls, data, game_version: str, orders_version: int):
+        return cls.from_cursor(binutils.Cursor(data), game_version, orders_version)
 
     # XXX: is this exhaustive?
     _TARGET_STRING_DATA = (
@@ -43,10 +95,20 @@ class _Order:
     @classmethod
     def _decode_target_string(cls, field, target_string):
         if field in cls._TARGET_STRING_DATA:
-            return miniyaml.load(target_string)
+            return _load_target_string(target_string)
         return target_string
 
 
+_U8 = binutils.get_struct('B')
+_I16 = binutils.get_struct('h')
+_I32 = binutils.get_struct('i')
+_U32 = binutils.get_struct('I')
+_U32_PAIR = binutils.get_struct('II')
+_SYNC_HASH = binutils.get_struct('IQ')
+_CELL = binutils.get_struct('ib')
+_POS = binutils.get_struct('iii')
+
+
 class OrderSyncHash(_Order):
 
     def __init__(self, sync_hash, defeat_state=None):
@@ -54,17 +116,20 @@ class OrderSyncHash(_Order):
         self.defeat_state = defeat_state
 
     @classmethod
-    def from_data(cls, data, game_version: str, orders_version: int):
+    def from_cursor(cls, cursor, game_version: str, orders_version: int):
+        start = cursor.offset
         if orders_version is not None and orders_version >= 11:
-            sync_hash, defeat_state = binutils.parse_fmt(data, 'IQ')
+            sync_hash, defeat_state = cursor.read_struct(_SYNC_HASH)
             obj = cls(sync_hash, defeat_state)
-            obj.data = data[:4+8]
         else:
-            sync_hash, = binutils.parse_fmt(data, 'I')
+            sync_hash, = cursor.read_struct(_U32)
             obj = cls(sync_hash)
-            obj.data = data[:4]
+        obj.data = cursor.data[start:cursor.offset]
         return obj
 
+    def as_dict(self):
+        return dict(sync_hash=self.sync_hash, defeat_state=self.defeat_state)
+
     def __str__(self):
         s = f'[SyncHash] hash:0x{self.sync_hash:08X}'
         if self.defeat_state is not None:
@@ -75,10 +140,13 @@ class OrderSyncHash(_Order):
 class OrderDisconnect(_Order):
 
     @classmethod
-    def from_data(cls, data, game_version: str, orders_version: int):
-        assert len(data) == 0
+    def from_cursor(cls, cursor, game_version: str, orders_version: int):
+        assert len(cursor) == 0
         return cls()
 
+    def as_dict(self):
+        return {}
+
     def __str__(self):
         return '[Disconnect]'
 
@@ -91,9 +159,9 @@ class OrderHandshake(_Order):
         self.orders_version = orders_version
 
     @classmethod
-    def from_data(cls, data, game_version: str, orders_version: int):
-        key, key_size = csharp.parse_string(data)
-        value, value_size = csharp.parse_string(data[key_size:])
+    def from_cursor(cls, cursor, game_version: str, orders_version: int):
+        key = csharp.read_string(cursor)
+        value = csharp.read_string(cursor)
         value = cls._decode_target_string(key, value)
         orders_version = None
         if key == b'HandshakeResponse':
@@ -102,7 +170,11 @@ class OrderHandshake(_Order):
                 orders_version = int(orders_protocol)
         return cls(key, value, orders_version)
 
+    def as_dict(self):
+        return dict(key=self.key, value=self.value)
+
     def __str__(self):
+        import pprint
         return f'[Handshake] type:{self.key.decode()} value:\n{pprint.pformat(self.value)}'
 
 
@@ -124,79 +196,144 @@ class OrderFields(_Order):
         self.field = field
         self.info = info
 
+    @staticmethod
+    def peek_field(cursor):
+        return csharp.read_string(binutils.Cursor(cursor.data, cursor.offset))
+
     @classmethod
-    def from_data(cls, data, game_version: str, orders_version: int):
-        field, field_size = csharp.parse_string(data)
-        data = data[field_size:]
+    def from_cursor(cls, cursor, game_version: str, orders_version: int):
+        field = csharp.read_string(cursor)
+        return cls(field, cls.decode_info(field, cursor, orders_version))
 
+    @classmethod
+    def decode_info(cls, field, cursor, orders_version: int):
+        # The data and offset are kept local (and only synced back with the
+        # cursor around the strings), saving a method call per field
         info = {}
+        data, offset = cursor.data, cursor.offset
 
         if orders_version is None:
             orders_version = 7
 
         if orders_version < 8:
-            info['subject_id'], = binutils.parse_fmt(data, 'I')
-            data = data[4:]
+            info['subject_id'], = _U32.unpack_from(data, offset)
+            offset += 4
 
-        flags_fmt, flags_size = ('B', 1) if orders_version < 11 else ('h', 2)
-        flags, = binutils.parse_fmt(data, flags_fmt)
-        data = data[flags_size:]
+        if orders_version < 11:
+            flags = data[offset]
+            offset += 1
+        else:
+            flags, = _I16.unpack_from(data, offset)
+            offset += 2
 
         if flags & cls._FLAG_SUBJECT:  # added in orders_version == 8
-            info['subject_id'], = binutils.parse_fmt(data, 'I')
-            data = data[4:]
+            info['subject_id'], = _U32.unpack_from(data, offset)
+            offset += 4
 
         if flags & cls._FLAG_TARGET:
-            target_type = data[0]
-            data = data[1:]
+            target_type = data[offset]
+            offset += 1
 
             if target_type == cls._TARGET_TYPE_ACTOR:
-                info['target_actor_id'], = binutils.parse_fmt(data, 'I')
-                data = data[4:]
+                info['target_actor_id'], = _U32.unpack_from(data, offset)
+                offset += 4
 
             elif target_type == cls._TARGET_TYPE_FROZEN_ACTOR:
-                info['player_actor_id'], info['frozen_actor_id'] = binutils.parse_fmt(data, 'II')
-                data = data[8:]
+                info['player_actor_id'], info['frozen_actor_id'] = _U32_PAIR.unpack_from(data, offset)
+                offset += _U32_PAIR.size
 
             elif target_type == cls._TARGET_TYPE_TERRAIN:
                 if flags & cls._FLAG_TARGETISCELL:
-                    info['cell'], info['sub_cell'] = binutils.parse_fmt(data, 'ib')
-                    data = data[5:]
+                    info['cell'], info['sub_cell'] = _CELL.unpack_from(data, offset)
+                    offset += _CELL.size
                 else:
-                    info['pos'] = binutils.parse_fmt(data, 'iii')
-                    data = data[12:]
+                    info['pos'] = _POS.unpack_from(data, offset)
+                    offset += _POS.size
 
         if flags & cls._FLAG_TARGETSTRING:
-            target_string, target_string_size = csharp.parse_string(data)
+            cursor.offset = offset
+            target_string = csharp.read_string(cursor)
+            offset = cursor.offset
             info['target'] = cls._decode_target_string(field, target_string)
-            data = data[target_string_size:]
 
         if flags & cls._FLAG_EXTRAACTORS:  # added in orders_version 10
-            count, = binutils.parse_fmt(data, 'i')
-            data = data[4:]
-            info['extra_actors'] = binutils.parse_fmt(data, 'I' * count)
-            data = data[4 * count:]
+            count, = _I32.unpack_from(data, offset)
+            array = binutils.get_struct(f'{count}I')
+            info['extra_actors'] = array.unpack_from(data, offset + 4)
+            offset += 4 + array.size
 
         if flags & cls._FLAG_EXTRALOCATION:
-            info['extra_location'], = binutils.parse_fmt(data, 'i')
-            data = data[4:]
+            info['extra_location'], = _I32.unpack_from(data, offset)
+            offset += 4
 
         if flags & cls._FLAG_EXTRADATA:
-            info['extra_data'], = binutils.parse_fmt(data, 'I')
-            data = data[4:]
+            info['extra_data'], = _U32.unpack_from(data, offset)
+            offset += 4
 
         if flags & cls._FLAG_GROUPED:  # added in orders_version == 11
-            count, = binutils.parse_fmt(data, 'i')
-            data = data[4:]
-            info['grouped_actors'] = binutils.parse_fmt(data, 'I' * count)
-            data = data[4 * count:]
+            count, = _I32.unpack_from(data, offset)
+            array = binutils.get_struct(f'{count}I')
+            info['grouped_actors'] = array.unpack_from(data, offset + 4)
+            offset += 4 + array.size
 
-        return cls(field, info)
+        cursor.offset = offset
+        return info
+
+    def as_dict(self):
+        return dict(field=self.field, info=self.info)
 
     def __str__(self):
+        import pprint
         return f'[Fields] field:{self.field.decode()} info:\n{pprint.pformat(self.info)}'
 
 
+class OrderFieldsView(_Order):
+    '''Lightweight counterpart of OrderFields only holding the field name
+    and the location of the order in the packet data; the info dict is
+    decoded the first time it is accessed'''
+
+    __slots__ = ('field', '_data', '_offset', '_orders_version', '_info')
+
+    TYPE = 'Fields'
+
+    def __init__(self, field, data, offset, orders_version):
+        self.field = field
+        self._data = data
+        self._offset = offset
+        self._orders_version = orders_version
+        self._info = None
+
+    @classmethod
+    def from_cursor(cls, cursor, game_version: str, orders_version: int):
+        field = csharp.read_string(cursor)
+        return cls(field, cursor.data, cursor.offset, orders_version)
+
+    @property
+    def info(self):
+        if self._info is None:
+            cursor = binutils.Cursor(self._data, self._offset)
+            self._info = OrderFields.decode_info(self.field, cursor, self._orders_version)
+        return self._info
+
+    as_dict = OrderFields.as_dict
+    __str__ = OrderFields.__str__
+
+
+class OrdersFilter:
+    '''Set of order types (such as 'Fields' or 'SyncHash') and/or field
+    names (such as b'Chat') to match orders against'''
+
+    def __init__(self, orders):
+        orders = set(orders)
+        self.fields = {f for f in orders if isinstance(f, bytes)}
+        self.types = orders - self.fields
+
+    def match(self, order):
+        if order.type in self.types:
+            return True
+        return order.type == 'Fields' and order.field in self.fields
+
+
 class Decoder:
 
     _order_map = {
@@ -206,16 +343,35 @@ class Decoder:
         0xff: OrderFields,
     }
 
-    def __init__(self, game_info: dict):
+    # Orders always decoded, even when filtered out, because the decoder
+    # state depends on them
+    _STATE_FIELDS = {b'SyncInfo'}
+
+    def __init__(self, game_info: dict, orders_filter=None, lazy=False):
         self._orders_version = None
         self._game_info = game_info
         self._game_version = game_info['Root']['Version']
         self._client_names = {}
+        self._sync_info = None
+
+        # Orders not matching the filter are skipped without being decoded
+        self._orders_filter = OrdersFilter(orders_filter) if orders_filter is not None else None
+
+        # In lazy mode, Fields orders are yielded as OrderFieldsView
+        if lazy:
+            self._order_map = {**self._order_map, 0xff: OrderFieldsView}
 
         # FIXME: only valid with red alert default game speed
         self._time_step = 40  # ms
         self._order_latency = 3
 
+    def _update_client_names(self, sync_info):
+        # Parsing results are cached, so an unchanged payload is the same object
+        if sync_info is self._sync_info:
+            return
+        self._sync_info = sync_info
+        self._client_names = self._get_client_names(sync_info)
+
     @staticmethod
     def _get_client_names(sync_info):
         client_names = {}
@@ -227,34 +383,67 @@ class Decoder:
             client_names[client_id] = client_name
         return client_names
 
+    def _skip_order(self, order_cls, cursor):
+        orders_filter = self._orders_filter
+        if orders_filter is None or order_cls.TYPE in orders_filter.types:
+            return False
+        if order_cls is OrderHandshake:
+            return False
+        if order_cls.TYPE == 'Fields':
+            field = OrderFields.peek_field(cursor)
+            return field not in orders_filter.fields and field not in self._STATE_FIELDS
+        return True
+
     def decode_packet(self, pkt: Packet):
-        data = pkt.data
-        while data:
-            order_type = data[0]
+        cursor = binutils.Cursor(pkt.data)
+        while cursor:
+            order_type = cursor.read_u8()
             order_cls = self._order_map[order_type]
-            order = order_cls.from_data(data[1:], self._game_version, self._orders_version)
+            if self._skip_order(order_cls, cursor):
+                # XXX: only the first order of the packet is decoded for now
+                cursor.skip(len(cursor))
+                continue
+            order = order_cls.from_cursor(cursor, self._game_version, self._orders_version)
 
             if order.type == 'Handshake':
                 if self._orders_version is None:
                     self._orders_version = order.orders_version
                 if order.key == b'SyncInfo':  # old method
-                    self._client_names = self._get_client_names(order.value)
+                    self._update_client_names(order.value)
             elif order.type == 'Fields':
                 if order.field == b'SyncInfo':
-                    self._client_names = self._get_client_names(order.info['target'])
+                    self._update_client_names(order.info['target'])
 
-            data = data[len(data):]
-            yield order
+            # XXX: only the first order of the packet is decoded for now
+            cursor.skip(len(cursor))
+            if self._orders_filter is None or self._orders_filter.match(order):
+                yield order
 
     def get_name(self, client_id):
         return self._client_names[client_id]
 
+    def get_client_names(self):
+        return dict(self._client_names)
+
+    def get_game_info(self):
+        return self._game_info
+
+    def get_frame_tick(self, frame_id):
+        return frame_id * self._order_latency
+
     def get_frame_time(self, frame_id):
-        tick = frame_id * self._order_latency
-        total_ms = tick * self._time_step
-        total_s = total_ms // 1000
-        total_m = total_s // 60
-        ms = total_ms % 1000
-        s = total_s % 60
-        m = total_m
-        return f'{m:02}:{s:02}.{ms:03}'
+        return self.get_tick_time(self.get_frame_tick(frame_id))
+
+    def get_tick_ms(self, tick):
+        return tick * self._time_step
+
+    def get_tick_time(self, tick):
+        return format_ms(self.get_tick_ms(tick))
+
+    def get_frame_id(self, frame_time):
+        '''Reverse of get_frame_time(), see parse_frame_time()'''
+        frame_id, total_s = parse_frame_time(frame_time)
+        if frame_id is not None:
+            return frame_id
+        tick = round(total_s * 1000) // self._time_step
+        return tick // self._order_latency
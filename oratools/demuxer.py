@@ -15,6 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import mmap
+import os
+
 from . import binutils, miniyaml
 from .packet import Packet
 
@@ -34,38 +37,100 @@ class FileDemuxer(_Demuxer):
     START_MARKER = -1
     END_MARKER = -2
 
-    def __init__(self, input_file, forced_version=None):
+    def __init__(self, input_file, forced_version=None, use_mmap=False):
         self._input_file = input_file
+        self._view = None
+        self._offset = 0
+
+        # In mmap mode, the packets data are memoryview slices of the
+        # mapping: nothing is copied until a decoder actually needs the bytes
+        # (an empty file can not be mapped, it is read the normal way)
+        if use_mmap and os.fstat(input_file.fileno()).st_size:
+            self._view = memoryview(mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ))
 
         if forced_version:
             self.game_info = {'Root': {'Version': forced_version}}
             return
 
-        # probe footer
+        self.game_info = self.read_game_info(input_file)
+
+    @classmethod
+    def read_game_info(cls, input_file):
+        '''Parse the game information from the replay footer only, without
+        touching the packets stream'''
         # TODO: check file size
         input_file.seek(-8, 2)
         length, end_marker = binutils.read_data_fmt(input_file, 'ii')
-        if end_marker != self.END_MARKER:
+        if end_marker != cls.END_MARKER:
             raise Exception(f'Invalid end marker {end_marker}')
         input_file.seek(-(length + 16), 1)
         start_marker, version = binutils.read_data_fmt(input_file, 'ii')
-        if start_marker != self.START_MARKER:
+        if start_marker != cls.START_MARKER:
             raise Exception(f'Invalid start marker {start_marker}')
         game_data = input_file.read(length)
         length2, = binutils.parse_fmt(game_data, 'i')
         assert length2 == length - 4
         game_yaml = game_data[4:]
         input_file.seek(0, 0)
-        self.game_info = miniyaml.load(game_yaml)
+        return miniyaml.load(game_yaml)
+
+    def tell(self):
+        if self._view is None:
+            return self._input_file.tell()
+        return self._offset
+
+    def seek(self, offset):
+        if self._view is None:
+            self._input_file.seek(offset, 0)
+        else:
+            self._offset = offset
 
     def _read_packet(self):
-        return Packet.from_file(self._input_file)
+        if self._view is None:
+            return Packet.from_file(self._input_file)
+        packet, self._offset = Packet.from_buffer(self._view, self._offset)
+        return packet
 
 
 class SocketDemuxer(_Demuxer):
 
     def __init__(self, socket):
+        from . import network
+
         self._socket = socket
+        self._reader = network.SocketReader(socket)
 
     def _read_packet(self):
-        return Packet.from_socket(self._socket)
+        return Packet.from_socket(self._reader)
+
+
+class AsyncSocketDemuxer:
+    '''asyncio counterpart of SocketDemuxer, allowing to follow many games
+    concurrently in a single event loop'''
+
+    def __init__(self, reader, writer=None, timeout=None):
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+
+    @classmethod
+    async def connect(cls, server, port, timeout=None):
+        from . import network
+
+        reader, writer = await network.async_connect(server, port, timeout)
+        return cls(reader, writer, timeout)
+
+    async def read_packet(self):
+        import asyncio
+
+        while True:
+            packet = await asyncio.wait_for(Packet.from_stream(self._reader), self._timeout or None)
+            if packet is None:
+                break
+            yield packet
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        await self._writer.wait_closed()
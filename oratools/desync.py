@@ -0,0 +1,134 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+from . import pipeline
+
+
+class SyncChecker:
+    '''Streaming comparison of the sync states reported by the clients, frame
+    by frame. The states of a frame are compared once a frame more than
+    window frames ahead is reported, so only the last window frames are
+    kept in memory.'''
+
+    def __init__(self, window=64):
+        self._window = window
+        self._pending = {}
+        self._next_frame = None
+        self._last_frame = None
+        self.nb_frames = 0
+        self.nb_late = 0
+
+    def feed(self, client, frame, state):
+        '''Add the state of a client at a frame; return the list of the
+        divergent (frame, {client: state}) among the completed frames'''
+        if self._next_frame is None:
+            self._next_frame = self._last_frame = frame
+        if frame < self._next_frame:
+            self.nb_late += 1
+            return []
+        states = self._pending.get(frame)
+        if states is None:
+            states = self._pending[frame] = {}
+        states[client] = state
+        if frame <= self._last_frame:
+            return []
+        self._last_frame = frame
+        return self._flush(frame - self._window)
+
+    def close(self):
+        '''Complete all the pending frames'''
+        if self._last_frame is None:
+            return []
+        return self._flush(self._last_frame)
+
+    def _flush(self, until):
+        divergences = []
+        pending = self._pending
+        while self._next_frame <= until:
+            states = pending.pop(self._next_frame, None)
+            if states is not None:
+                self.nb_frames += 1
+                if len(set(states.values())) > 1:
+                    divergences.append((self._next_frame, states))
+            self._next_frame += 1
+        return divergences
+
+
+class DesyncAnalyzer(pipeline.Analyzer):
+    '''First frame where the clients disagree on the game state'''
+
+    NAME = 'desync'
+    ORDERS_FILTER = {'SyncHash'}
+
+    def __init__(self, decoder, args=None):
+        super().__init__(decoder, args)
+        self._checker = SyncChecker()
+        self._desync = None
+
+    def feed(self, pkt, order):
+        divergences = self._checker.feed(pkt.client, pkt.frame, (order.sync_hash, order.defeat_state))
+        if divergences:
+            self._set_desync(*divergences[0])
+
+    def _set_desync(self, frame, states):
+        names = self._dec.get_client_names()
+
+        # Clients sharing the same state, the majority first
+        groups = {}
+        for client, state in sorted(states.items()):
+            groups.setdefault(state, []).append(names.get(client, f'#{client}'))
+        groups = sorted(groups.items(), key=lambda group: -len(group[1]))
+
+        self._desync = dict(
+            frame=frame,
+            time=self._dec.get_frame_time(frame),
+            groups=[dict(sync_hash=sync_hash, defeat_state=defeat_state, clients=clients)
+                    for (sync_hash, defeat_state), clients in groups],
+        )
+        self.done = True
+
+    def get_result(self):
+        if self._desync is None:
+            divergences = self._checker.close()
+            if divergences:
+                self._set_desync(*divergences[0])
+        if self._checker.nb_late:
+            logging.warning(f'{self._checker.nb_late} SyncHash received too late to be compared')
+        return dict(nb_frames=self._checker.nb_frames, desync=self._desync)
+
+    @staticmethod
+    def render(result):
+        desync = result['desync']
+        if desync is None:
+            logging.info(f'  No desync over {result["nb_frames"]} frames')
+            return
+        logging.info(f'  Desync at frame {desync["frame"]} ({desync["time"]}) after {result["nb_frames"]} frames:')
+        for group in desync['groups']:
+            state = f'hash:0x{group["sync_hash"]:08X}'
+            if group['defeat_state'] is not None:
+                state += f' defeat_state:0x{group["defeat_state"]:016X}'
+            logging.info(f'    {state}: {", ".join(group["clients"])}')
+
+    @staticmethod
+    def get_json_entries(result):
+        yield dict(type='desync', **result)
+
+
+def desync(filename, args):
+    pipeline.run(filename, args, [DesyncAnalyzer])
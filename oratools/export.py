@@ -0,0 +1,184 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import logging
+import os
+import os.path as op
+import struct
+from array import array
+
+import numpy as np
+
+from .decoder import Decoder
+from .demuxer import FileDemuxer
+
+
+# Value for the missing information in the int64 columns
+MISSING = np.iinfo(np.int64).min
+
+ORDER_TYPES = ('SyncHash', 'Disconnect', 'Handshake', 'Fields')
+
+# One entry per order (name, array typecode)
+_ORDER_COLUMNS = (
+    ('replay', 'i'),
+    ('frame', 'i'),
+    ('client', 'i'),
+    ('order_type', 'B'),
+    ('field', 'i'),  # index in fields.json, -1 for non Fields orders
+    ('subject_id', 'q'),
+    ('target_actor_id', 'q'),
+    ('cell', 'q'),
+    ('sub_cell', 'q'),
+    ('pos_x', 'q'),
+    ('pos_y', 'q'),
+    ('pos_z', 'q'),
+    ('extra_location', 'q'),
+    ('extra_data', 'q'),
+)
+
+# Actor lists are flattened, with an offsets column of len(orders)+1
+# entries: the actors of order i are actors[offsets[i]:offsets[i+1]]
+_ACTOR_LISTS = ('extra_actors', 'grouped_actors')
+
+# The .npy header is written with a fixed size, so it can be rewritten with
+# the final shape once all the chunks have been written
+_NPY_HEADER_SIZE = 128
+
+
+def _get_npy_header(dtype, length):
+    header = repr({'descr': dtype.str, 'fortran_order': False, 'shape': (length,)})
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class _NpyColumn:
+    '''Column appended in chunks to a .npy file'''
+
+    def __init__(self, path, typecode):
+        self.values = array(typecode)
+        self._dtype = np.dtype(typecode)
+        self._length = 0
+        self._f = open(path, 'wb')
+        self._f.write(_get_npy_header(self._dtype, 0))
+
+    def flush(self):
+        self.values.tofile(self._f)
+        self._length += len(self.values)
+        del self.values[:]
+
+    def close(self):
+        self.flush()
+        self._f.seek(0)
+        self._f.write(_get_npy_header(self._dtype, self._length))
+        self._f.close()
+
+
+class _Exporter:
+
+    def __init__(self, out_dir, chunk_size, orders_filter):
+        os.makedirs(out_dir, exist_ok=True)
+        self._out_dir = out_dir
+        self._chunk_size = chunk_size
+        self._orders_filter = orders_filter
+        self._replays = []
+        self._fields = {}
+        self._nb_buffered = 0
+
+        columns = [(name, typecode) for name, typecode in _ORDER_COLUMNS]
+        for name in _ACTOR_LISTS:
+            columns += [(name, 'q'), (f'{name}_offsets', 'q')]
+        self._columns = {name: _NpyColumn(op.join(out_dir, f'{name}.npy'), typecode) for name, typecode in columns}
+        self._offsets = {name: 0 for name in _ACTOR_LISTS}
+        for name in _ACTOR_LISTS:
+            self._columns[f'{name}_offsets'].values.append(0)
+
+    def _get_field_id(self, field):
+        field_id = self._fields.get(field)
+        if field_id is None:
+            field_id = self._fields[field] = len(self._fields)
+        return field_id
+
+    def _add_order(self, replay_id, pkt, order):
+        columns = self._columns
+        info = order.info if order.type == 'Fields' else {}
+        pos = info.get('pos', (MISSING, MISSING, MISSING))
+
+        columns['replay'].values.append(replay_id)
+        columns['frame'].values.append(pkt.frame)
+        columns['client'].values.append(pkt.client)
+        columns['order_type'].values.append(ORDER_TYPES.index(order.type))
+        columns['field'].values.append(self._get_field_id(order.field) if order.type == 'Fields' else -1)
+        for name in ('subject_id', 'target_actor_id', 'cell', 'sub_cell', 'extra_location', 'extra_data'):
+            columns[name].values.append(info.get(name, MISSING))
+        columns['pos_x'].values.append(pos[0])
+        columns['pos_y'].values.append(pos[1])
+        columns['pos_z'].values.append(pos[2])
+
+        for name in _ACTOR_LISTS:
+            actors = info.get(name, ())
+            columns[name].values.extend(actors)
+            self._offsets[name] += len(actors)
+            columns[f'{name}_offsets'].values.append(self._offsets[name])
+
+        self._nb_buffered += 1
+        if self._nb_buffered == self._chunk_size:
+            for column in columns.values():
+                column.flush()
+            self._nb_buffered = 0
+
+    def add_replay(self, filename, args):
+        replay_id = len(self._replays)
+        self._replays.append(filename)
+        with open(filename, 'rb') as f:
+            fmt = FileDemuxer(f, args.forced_version, args.mmap)
+            dec = Decoder(fmt.game_info, self._orders_filter)
+            try:
+                for pkt in fmt.read_packet():
+                    for order in dec.decode_packet(pkt):
+                        self._add_order(replay_id, pkt, order)
+            except ValueError as e:
+                logging.error(e)
+
+    def close(self):
+        for column in self._columns.values():
+            column.close()
+        metadata = dict(
+            replays=self._replays,
+            fields=[field.decode(errors='replace') for field in self._fields],
+            order_types=ORDER_TYPES,
+            missing=int(MISSING),
+        )
+        with open(op.join(self._out_dir, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=1)
+
+
+def export(replays, args):
+    orders_filter = None
+    if args.filter:
+        orders_filter = {f if f in ORDER_TYPES else f.encode() for f in args.filter}
+
+    exporter = _Exporter(args.out_dir, args.chunk_size, orders_filter)
+    try:
+        for replay in replays:
+            logging.info(f'Replay: {replay}')
+            try:
+                exporter.add_replay(replay, args)
+            except:
+                logging.error('unable to read %s', replay)
+    finally:
+        exporter.close()
@@ -0,0 +1,45 @@
+#
+# Copyright (C) 2020
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+from .decoder import Decoder
+from .demuxer import FileDemuxer
+
+
+def info(filename, args):
+    with open(filename, 'rb') as f:
+        game_info = FileDemuxer.read_game_info(f)
+
+    root = game_info.get('Root', {})
+    dec = Decoder(game_info)
+    final_tick = root.get('FinalGameTick')
+    duration = dec.get_tick_time(int(final_tick)) if final_tick else '?'
+
+    logging.info(f'  Map: {root.get("MapTitle", "?")}')
+    logging.info(f'  Version: {root.get("Mod", "?")} {root.get("Version", "?")}')
+    logging.info(f'  Start: {root.get("StartTimeUtc", "?")} (UTC)')
+    logging.info(f'  Duration: {duration}')
+    logging.info('  Players:')
+    for key, player in game_info.items():
+        if not key.startswith('Player@'):
+            continue
+        name = player.get('Name', '?')
+        faction = player.get('FactionName', '?')
+        team = player.get('Team', '?')
+        outcome = player.get('Outcome', '?')
+        logging.info(f'    {name} [{faction}] team:{team} outcome:{outcome}')
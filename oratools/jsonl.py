@@ -0,0 +1,62 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import atexit
+import json
+import sys
+
+
+def _default(obj):
+    if isinstance(obj, (bytes, memoryview)):
+        return bytes(obj).decode(errors='replace')
+    raise TypeError(f'{obj.__class__.__name__} is not JSON serializable')
+
+
+class JsonlWriter:
+    '''Write one compact JSON object per line into a binary stream'''
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default).encode
+
+    def write(self, obj):
+        self._stream.write((self._encode(obj) + '\n').encode())
+
+    def write_raw(self, data):
+        self._stream.write(data)
+
+    def flush(self):
+        self._stream.flush()
+
+
+_writer = None
+
+
+def get_writer():
+    '''Process-wide writer, buffering into the standard output'''
+    global _writer
+    if _writer is None:
+        stream = open(sys.stdout.fileno(), 'wb', buffering=1 << 20, closefd=False)
+        _writer = JsonlWriter(stream)
+        atexit.register(_writer.flush)
+    return _writer
+
+
+def set_writer(writer):
+    global _writer
+    prev_writer, _writer = _writer, writer
+    return prev_writer
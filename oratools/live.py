@@ -0,0 +1,52 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import logging
+
+from .decoder import Decoder
+from .demuxer import AsyncSocketDemuxer
+
+
+async def run_session(demuxer, decoder, feed):
+    '''Decode the packets of a live game and pass every (packet, order) to
+    the feed callback (such as pipeline.Analyzer.feed)'''
+    async for pkt in demuxer.read_packet():
+        for order in decoder.decode_packet(pkt):
+            feed(pkt, order)
+
+
+async def _follow(server, port, version, feed, timeout, orders_filter):
+    demuxer = await AsyncSocketDemuxer.connect(server, port, timeout)
+    try:
+        decoder = Decoder({'Root': {'Version': version}}, orders_filter)
+        await run_session(demuxer, decoder, lambda pkt, order: feed((server, port), pkt, order))
+    finally:
+        await demuxer.close()
+
+
+async def follow(endpoints, version, feed, timeout=None, orders_filter=None):
+    '''Follow the games of all the (server, port) endpoints concurrently in
+    the running event loop; the feed callback receives the endpoint along
+    with every (packet, order). Return the exception ending each session
+    (None if the game ended normally).'''
+    sessions = [_follow(server, port, version, feed, timeout, orders_filter) for server, port in endpoints]
+    errors = await asyncio.gather(*sessions, return_exceptions=True)
+    for (server, port), error in zip(endpoints, errors):
+        if error is not None:
+            logging.error(f'{server}:{port}: session ended with {error!r}')
+    return errors
@@ -0,0 +1,45 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+
+class BufferHandler(logging.Handler):
+    '''Log handler keeping the (level, message) of the records, for a worker
+    process to hand its log output over to the parent process'''
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+
+def buffer_logs():
+    '''Redirect all the log output of the (worker) process into the returned
+    BufferHandler'''
+    handler = BufferHandler()
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel('INFO')
+    return handler
+
+
+def emit_records(records):
+    for level, msg in records:
+        logging.log(level, msg)
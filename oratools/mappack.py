@@ -15,7 +15,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from PIL import Image
 import logging
 import os
 import os.path as op
@@ -165,78 +164,152 @@ def _reformat_title(args, title):
     return title
 
 
+def _get_mapname(mapfile, args):
+    '''Compute a base filename for the map from its (new) Title'''
+    with zipfile.ZipFile(mapfile) as zipf:
+        with zipf.open('map.yaml') as mapf:
+            title = _extract_title(mapf)
+    if title is None:
+        raise Exception('no Title found in map.yaml')
+    mapname = _reformat_title(args, title)
+    mapname = unicodedata.normalize('NFKD', mapname).encode('ascii', 'ignore').decode()
+    mapname = _special_regex.sub('-', mapname).strip('-')
+    return mapname.lower()
+
+
+def _get_unique_mapnames(maps, args):
+    '''Map names, suffixed when several titles normalize to the same name
+    (the output files would overwrite each other otherwise); None for the
+    maps which cannot be read'''
+    mapnames = []
+    used = set()
+    for mapfile in maps:
+        try:
+            base_mapname = mapname = _get_mapname(mapfile, args)
+        except Exception as e:
+            logging.error('unable to pack %s: %s', mapfile, e)
+            mapnames.append(None)
+            continue
+        suffix = 2
+        while mapname in used:
+            mapname = f'{base_mapname}-{suffix}'
+            suffix += 1
+        if mapname != base_mapname:
+            logging.warning('%s: map name %s already in use, using %s instead', mapfile, base_mapname, mapname)
+        used.add(mapname)
+        mapnames.append(mapname)
+    return mapnames
+
+
+def _pack_map(mapfile, mapname, args):
+    with tempfile.TemporaryDirectory(prefix='oratools-') as tmpdirname:
+
+        # Extract current map data in a temporary directory
+        with zipfile.ZipFile(mapfile) as zipf:
+            logging.info('=== Map: %s ===', mapname)
+            mapdir = op.join(tmpdirname, mapname)
+            map_files = set(op.join(mapdir, f) for f in zipf.namelist())
+            zipf.extractall(path=mapdir)
+
+        # Patch map.yaml
+        map_yml = op.join(mapdir, 'map.yaml')
+        extensions = _Extensions(map_yml, args.ext or [], args.rm or [])
+        map_yml_content = _get_new_map_yml_content(map_yml, extensions, args)
+        with open(map_yml, 'w') as mapf:
+            mapf.write(map_yml_content)
+        patched_files = {map_yml}
+
+        # Patch map preview overlay
+        if args.overlay:
+            from PIL import Image
+
+            map_preview = op.join(mapdir, 'map.png')
+            bg = Image.open(map_preview)
+            fg = Image.open(args.overlay)
+            fg = fg.resize(bg.size, Image.LANCZOS)
+            bg.paste(fg, mask=fg)
+            bg.save(map_preview)
+            patched_files |= {map_preview}
+
+        # Identify the list of files not to include in the map
+        remove_files = set()
+        if args.rm:
+            target_removed_files = set(args.rm)
+            remove_files = {f for f in map_files if op.basename(f) in target_removed_files}
+
+        # Transfer extension files into the temporary map directory
+        src_ext_files = list(extensions.get_files())
+        dst_ext_files = [op.join(mapdir, op.basename(f)) for f in src_ext_files]
+        for (src, dst) in zip(src_ext_files, dst_ext_files):
+            shutil.copyfile(src, dst)
+        ext_files = set(dst_ext_files)
+
+        # Zip referenced content into the new map
+        out_map = op.join(args.out_dir, mapname + '.oramap')
+        logging.info('[+] Creating %s', out_map)
+        with zipfile.ZipFile(out_map, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as mapf:
+            files = map_files | ext_files | remove_files
+            for new_file in sorted(files):
+                if new_file in patched_files:
+                    action = _colored('Patch', 'magenta')
+                elif new_file in ext_files:
+                    if new_file in map_files:
+                        action = _colored('Replace', 'yellow')
+                    else:
+                        action = _colored('Add', 'green')
+                elif new_file in remove_files:
+                    action = _colored('Remove', 'red')
+                else:
+                    action = _colored('Copy', 'cyan')
+
+                logging.info("    [%s] %s", action, op.basename(new_file))
+                if new_file not in remove_files:
+                    mapf.write(new_file, arcname=op.basename(new_file))
+
+
+def _run_pack_map(mapfile, mapname, args):
+    try:
+        _pack_map(mapfile, mapname, args)
+    except Exception as e:
+        logging.error('unable to pack %s: %s', mapfile, e)
+        return False
+    return True
+
+
+def _pack_map_buffered(job):
+    from . import logutils
+
+    handler = logutils.buffer_logs()
+    ok = _run_pack_map(*job)
+    return ok, handler.records
+
+
 def mappack(args):
 
     if args.title and '{title}' not in args.title:
         raise ValueError('Title must contain "{title}"')
 
-    with tempfile.TemporaryDirectory(prefix='oratools-') as tmpdirname:
-        for mapfile in args.maps:
-
-            # Extract current map data in a temporary directory
-            with zipfile.ZipFile(mapfile) as zipf:
-
-                # Compute a new base filename for the map from its Title
-                with zipf.open('map.yaml') as mapf:
-                    mapname = _reformat_title(args, _extract_title(mapf))
-                    mapname = unicodedata.normalize('NFKD', mapname).encode('ascii', 'ignore').decode()
-                    mapname = _special_regex.sub('-', mapname).strip('-')
-                    mapname = mapname.lower()
-
-                logging.info('=== Map: %s ===', mapname)
-                mapdir = op.join(tmpdirname, mapname)
-                map_files = set(op.join(mapdir, f) for f in zipf.namelist())
-                zipf.extractall(path=mapdir)
-
-            # Patch map.yaml
-            map_yml = op.join(mapdir, 'map.yaml')
-            extensions = _Extensions(map_yml, args.ext, args.rm)
-            map_yml_content = _get_new_map_yml_content(map_yml, extensions, args)
-            with open(map_yml, 'w') as mapf:
-                mapf.write(map_yml_content)
-            patched_files = {map_yml}
-
-            # Patch map preview overlay
-            if args.overlay:
-                map_preview = op.join(mapdir, 'map.png')
-                bg = Image.open(map_preview)
-                fg = Image.open(args.overlay)
-                fg = fg.resize(bg.size, Image.LANCZOS)
-                bg.paste(fg, mask=fg)
-                bg.save(map_preview)
-                patched_files |= {map_preview}
-
-            # Identify the list of files not to include in the map
-            if args.rm:
-                target_removed_files = set(args.rm)
-                remove_files = {f for f in map_files if op.basename(f) in target_removed_files}
-
-            # Transfer extension files into the temporary map directory
-            src_ext_files = list(extensions.get_files())
-            dst_ext_files = [op.join(mapdir, op.basename(f)) for f in src_ext_files]
-            for (src, dst) in zip(src_ext_files, dst_ext_files):
-                shutil.copyfile(src, dst)
-            ext_files = set(dst_ext_files)
-
-            # Zip referenced content into the new map
-            os.makedirs(args.out_dir, exist_ok=True)
-            out_map = op.join(args.out_dir, mapname + '.oramap')
-            logging.info('[+] Creating %s', out_map)
-            with zipfile.ZipFile(out_map, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as mapf:
-                files = map_files | ext_files | remove_files
-                for new_file in sorted(files):
-                    if new_file in patched_files:
-                        action = _colored('Patch', 'magenta')
-                    elif new_file in ext_files:
-                        if new_file in map_files:
-                            action = _colored('Replace', 'yellow')
-                        else:
-                            action = _colored('Add', 'green')
-                    elif new_file in remove_files:
-                        action = _colored('Remove', 'red')
-                    else:
-                        action = _colored('Copy', 'cyan')
-
-                    logging.info("    [%s] %s", action, op.basename(new_file))
-                    if new_file not in remove_files:
-                        mapf.write(new_file, arcname=op.basename(new_file))
+    os.makedirs(args.out_dir, exist_ok=True)
+    mapnames = _get_unique_mapnames(args.maps, args)
+    nb_failed = mapnames.count(None)
+    maps = [(mapfile, mapname) for mapfile, mapname in zip(args.maps, mapnames) if mapname is not None]
+
+    if args.jobs == 1:
+        for mapfile, mapname in maps:
+            nb_failed += not _run_pack_map(mapfile, mapname, args)
+    else:
+        # Every map is packed in a worker process with its log output
+        # buffered, and emitted in the original maps order
+        import multiprocessing
+
+        from . import logutils
+
+        jobs = ((mapfile, mapname, args) for mapfile, mapname in maps)
+        with multiprocessing.Pool(args.jobs or None) as pool:
+            for ok, records in pool.imap(_pack_map_buffered, jobs):
+                logutils.emit_records(records)
+                nb_failed += not ok
+
+    if nb_failed:
+        logging.error('%d map(s) out of %d could not be packed', nb_failed, len(args.maps))
+        sys.exit(1)
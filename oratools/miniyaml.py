@@ -15,37 +15,107 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import re
+class Loader:
+    '''Single pass miniyaml parser; data can be fed incrementally by chunks
+    of any size, and the result is obtained with close()'''
 
+    def __init__(self):
+        self._root = {}
+        # Current dict for every indentation level; a (parent, key) pair
+        # stands for a key without value, which only becomes a dict once it
+        # gets a child (it is an empty string otherwise)
+        self._levels = [self._root]
+        self._tail = b''
 
-_LINE_RE = re.compile(r'^(?P<indent>\t*)(?:(?P<key>[^:]*):\s*)?(?P<value>.*)')
+    def feed(self, data):
+        data = self._tail + data
+        end = max(data.rfind(b'\n'), data.rfind(b'\r')) + 1
+        self._tail = data[end:]
+        if end:
+            self._parse_lines(data[:end].decode().splitlines())
 
+    def close(self):
+        if self._tail:
+            self._parse_lines(self._tail.decode().splitlines())
+            self._tail = b''
+        return self._root or ''
 
-def _cleanup(d):
-    if d == {}:
-        return ''
-    for k, v in d.items():
-        if not isinstance(v, dict):
-            continue
-        d[k] = _cleanup(d[k])
-    return d
+    def _parse_lines(self, lines):
+        levels = self._levels
+        for line in lines:
+            stripped = line.lstrip('\t')
+            colon = stripped.find(':')
+            if colon <= 0:
+                continue
+            level = len(line) - len(stripped)
+            key = stripped[:colon]
+            value = stripped[colon + 1:].lstrip()
+
+            # Only the children of a key without value can be indented
+            if level >= len(levels):
+                raise ValueError(f'Unexpected indentation of the "{key}" key')
+            parent = levels[level]
+            if type(parent) is tuple:
+                owner, owner_key = parent
+                parent = levels[level] = {}
+                # The key may have been overridden since
+                if owner.get(owner_key) == '':
+                    owner[owner_key] = parent
+
+            if value:
+                parent[key] = value
+            else:
+                parent[key] = ''
+                del levels[level + 1:]
+                levels.append((parent, key))
 
 
 def load(yaml_str):
-    yaml_str = yaml_str.decode()
-    levels = [{}]
-    for line in yaml_str.splitlines():
-        m = re.match(_LINE_RE, line)
-        indent, key, value = m.group('indent', 'key', 'value')
-        level = len(indent)
-        if not key:
-            continue
-        if not value:
-            value = {}
-            levels = levels[:level + 1] + [value]
-        parent = levels[level]
-        parent[key] = value
-    return _cleanup(levels[0])
+    loader = Loader()
+    loader.feed(yaml_str)
+    return loader.close()
+
+
+def serialize(data, level=0):
+    '''Serialize nested dicts of strings into miniyaml (inverse of load())'''
+    indent = '\t' * level
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            lines.append(f'{indent}{key}:\n'.encode())
+            lines.append(serialize(value, level + 1))
+        elif value == '':
+            lines.append(f'{indent}{key}:\n'.encode())
+        else:
+            lines.append(f'{indent}{key}: {value}\n'.encode())
+    return b''.join(lines)
+
+
+class FrozenDict(dict):
+    '''Read-only dict, for parsing results shared between several users'''
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(f'{self.__class__.__name__} is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    # Rebuilt from a plain dict since the default protocols fill the new
+    # object item by item
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(d):
+    if not isinstance(d, dict):
+        return d
+    return FrozenDict((k, freeze(v)) for k, v in d.items())
 
 
 def dump(data):
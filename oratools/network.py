@@ -15,25 +15,47 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import asyncio
 import socket
 
 
 class SocketReader:
+    '''Buffered reader on a socket: data is received with large recv_into()
+    calls in a preallocated buffer, serving many packets per syscall. The
+    reader must be kept for the whole session since it reads ahead.'''
 
-    def __init__(self, socket):
+    def __init__(self, socket, buffer_size=1 << 16):
         self._socket = socket
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self, n):
+        buffered = self._end - self._start
+        if self._start + n > len(self._buf):
+            if n > len(self._buf):
+                buf = bytearray(max(n, 2 * len(self._buf)))
+                buf[:buffered] = self._view[self._start:self._end]
+                self._view.release()
+                self._buf = buf
+                self._view = memoryview(buf)
+            else:
+                self._buf[:buffered] = self._buf[self._start:self._end]
+            self._start, self._end = 0, buffered
+
+        while self._end - self._start < n:
+            nread = self._socket.recv_into(self._view[self._end:])
+            if not nread:
+                raise Exception(f'Unexpected EOF after reading {self._end - self._start}/{n}')
+            self._end += nread
 
     def read(self, n):
-        buf = b''
-        while True:
-            data = self._socket.recv(n)
-            if not data:
-                raise Exception(f'Unexpected EOF after reading {len(buf)}/{n+len(buf)}')
-            buf += data
-            n -= len(data)
-            if n == 0:
-                break
-        return buf
+        if self._end - self._start < n:
+            self._fill(n)
+        start = self._start
+        self._start += n
+        return bytes(self._view[start:self._start])
 
 
 def connect(server, port, timeout):
@@ -42,3 +64,9 @@ def connect(server, port, timeout):
         s.settimeout(timeout)
     s.connect((server, port))
     return s
+
+
+async def async_connect(server, port, timeout):
+    '''asyncio counterpart of connect(), returning the stream reader and
+    writer of the connection'''
+    return await asyncio.wait_for(asyncio.open_connection(server, port), timeout or None)
@@ -0,0 +1,181 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+import numpy as np
+
+from . import jsonl, pipeline
+from .buildorder import BuildOrderAnalyzer
+from .decoder import Decoder
+from .demuxer import FileDemuxer
+
+
+_PERCENTILES = (0.25, 0.5, 0.75)
+
+# Outcome column values
+_LOST, _WON, _UNKNOWN = 0, 1, -1
+
+
+def _get_openings(filename, args):
+    '''First build steps of every player of the replay, as (client, outcome,
+    targets, end frames) tuples'''
+    with open(filename, 'rb') as f:
+        game_info = FileDemuxer.read_game_info(f)
+    result = pipeline.get_results(filename, args, [BuildOrderAnalyzer])
+    if result['error'] is not None:
+        logging.error(result['error'])
+
+    # Players are matched by client index, the names not being unique
+    outcomes = {}
+    for key, player in game_info.items():
+        if key.startswith('Player@') and 'ClientIndex' in player:
+            outcomes[int(player['ClientIndex'])] = player.get('Outcome')
+
+    openings = []
+    for build in result['results']['buildorder']['builds']:
+        targets = [target for _, _, target, _ in build['steps']]
+        frames = [end_frame for _, end_frame, _, _ in build['steps']]
+        openings.append((build['client'], outcomes.get(build['client']), targets, frames))
+    return game_info, openings
+
+
+def _openings_job(job):
+    filename, args = job
+    try:
+        return filename, _get_openings(filename, args)
+    except Exception as e:
+        return filename, e
+
+
+def _get_percentiles(groups, counts, values):
+    '''Percentiles of values (linearly interpolated) within every group,
+    groups being the indices in [0, len(counts)) of the values'''
+    order = np.lexsort((values, groups))
+    values = values[order]
+    starts = np.cumsum(counts) - counts
+    percentiles = []
+    for q in _PERCENTILES:
+        pos = q * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        v_lo = values[starts + lo]
+        v_hi = values[starts + hi]
+        percentiles.append(v_lo + (v_hi - v_lo) * (pos - lo))
+    return np.stack(percentiles, axis=-1)
+
+
+class _Aggregator:
+    '''Openings of all the players, encoded as rows of target codes in a
+    (nb_players, steps) array'''
+
+    def __init__(self, steps):
+        self._steps = steps
+        self._codes = {}
+        self._sequences = []
+        self._frames = []
+        self._outcomes = []
+        self.nb_replays = 0
+        self.nb_incomplete = 0
+        self.dec = None
+
+    def add(self, game_info, openings):
+        if self.dec is None:
+            self.dec = Decoder(game_info)
+        self.nb_replays += 1
+        for _, outcome, targets, frames in openings:
+            if len(targets) < self._steps:
+                self.nb_incomplete += 1
+                continue
+            self._sequences.append([self._codes.setdefault(target, len(self._codes)) for target in targets])
+            self._frames.append(frames)
+            self._outcomes.append(_WON if outcome == 'Won' else _LOST if outcome == 'Lost' else _UNKNOWN)
+
+    def get_stats(self):
+        '''Per opening (sorted by decreasing frequency): targets, count, won,
+        lost, and the frame percentiles of every step'''
+        if not self._sequences:
+            return []
+        sequences = np.array(self._sequences, dtype=np.int32)
+        frames = np.array(self._frames, dtype=np.float64)
+        outcomes = np.array(self._outcomes, dtype=np.int8)
+
+        uniques, groups, counts = np.unique(sequences, axis=0, return_inverse=True, return_counts=True)
+        groups = groups.reshape(-1)
+        won = np.bincount(groups, weights=outcomes == _WON, minlength=len(uniques)).astype(np.int64)
+        lost = np.bincount(groups, weights=outcomes == _LOST, minlength=len(uniques)).astype(np.int64)
+        percentiles = np.stack([_get_percentiles(groups, counts, frames[:, step]) for step in range(self._steps)],
+                               axis=1)
+
+        names = np.array(list(self._codes), dtype=object)
+        stats = [
+            (list(names[uniques[i]]), int(counts[i]), int(won[i]), int(lost[i]), percentiles[i].round().astype(int).tolist())
+            for i in range(len(uniques))
+        ]
+        return sorted(stats, key=lambda opening: (-opening[1], opening[0]))
+
+
+def _render(aggregator, stats, args):
+    dec = aggregator.dec
+    nb_players = sum(count for _, count, _, _, _ in stats)
+    logging.info(f'{nb_players} player(s) with {args.max_steps} build steps from {aggregator.nb_replays} replay(s), '
+                 f'{len(stats)} distinct opening(s) ({aggregator.nb_incomplete} incomplete skipped)')
+    if not stats:
+        return
+    logging.info(f'{"count":>6} {"freq":>7} {"won":>5} {"lost":>5} {"win%":>6}  {"last step p25/p50/p75":<31}  opening')
+    for targets, count, won, lost, percentiles in stats[:args.top]:
+        win_rate = f'{won * 100 / (won + lost):5.1f}%' if won + lost else '     -'
+        times = '/'.join(dec.get_frame_time(frame) for frame in percentiles[-1])
+        logging.info(f'{count:>6} {count * 100 / nb_players:6.2f}% {won:>5} {lost:>5} {win_rate}  {times:<31}  '
+                     + ' > '.join(targets))
+
+
+def _write_jsonl(aggregator, stats, args):
+    dec = aggregator.dec
+    writer = jsonl.get_writer()
+    for targets, count, won, lost, percentiles in stats[:args.top]:
+        steps = [
+            dict(target=target, **{f'p{round(q * 100)}': dec.get_frame_time(frame) for q, frame in zip(_PERCENTILES, step)})
+            for target, step in zip(targets, percentiles)
+        ]
+        writer.write(dict(type='opening', count=count, won=won, lost=lost, steps=steps))
+
+
+def openings(replays, args):
+    aggregator = _Aggregator(args.max_steps)
+    jobs = ((filename, args) for filename in replays)
+
+    def add_results(results):
+        for filename, data in results:
+            if isinstance(data, Exception):
+                logging.error('unable to read %s', filename)
+                continue
+            aggregator.add(*data)
+
+    if args.jobs == 1:
+        add_results(map(_openings_job, jobs))
+    else:
+        import multiprocessing
+
+        with multiprocessing.Pool(args.jobs or None) as pool:
+            add_results(pool.imap(_openings_job, jobs, chunksize=8))
+
+    stats = aggregator.get_stats()
+    if args.format == 'jsonl':
+        _write_jsonl(aggregator, stats, args)
+    else:
+        _render(aggregator, stats, args)
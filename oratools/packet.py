@@ -15,9 +15,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import logging
 import struct
 
-from . import binutils, network
+from . import binutils
 
 
 class Packet:
@@ -26,16 +27,48 @@ class Packet:
     # sent     packets are [length:i32]            [frame:i32][orders:length-4]
     # replay   packets are [client:i32][length:i32][frame:i32][orders:length-4]
 
+    _HEADER = struct.Struct('<iii')
+
     def __init__(self, client: int, frame: int, data: bytes):
         self.client = client
         self.frame = frame
         self.data = data
 
+    def to_bytes(self, swapped=True):
+        '''Serialize the packet, in the replay layout by default or in the
+        received layout otherwise (see from_file())'''
+        length = len(self.data) + 4
+        if swapped:
+            return self._HEADER.pack(self.client, length, self.frame) + self.data
+        return self._HEADER.pack(length, self.client, self.frame) + self.data
+
     @classmethod
-    def from_socket(cls, s):
-        reader = network.SocketReader(s)
+    def from_socket(cls, reader):
+        '''Read a received packet from a network.SocketReader'''
         return cls.from_file(reader, swapped=False)
 
+    @classmethod
+    async def from_stream(cls, reader):
+        '''Read a received packet from an asyncio.StreamReader; return None
+        at the end of the stream'''
+        import asyncio
+
+        try:
+            header = await reader.readexactly(cls._HEADER.size)
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise Exception(f'Unexpected EOF after reading {len(e.partial)}/{e.expected}')
+        length, client, frame = cls._HEADER.unpack(header)
+        if length < 4:
+            logging.error(f'Invalid packet length {length} from client {client}')
+            return None
+        try:
+            data = await reader.readexactly(length - 4)
+        except asyncio.IncompleteReadError as e:
+            raise Exception(f'Unexpected EOF after reading {len(e.partial)}/{e.expected}')
+        return cls(client, frame, data)
+
     @classmethod
     def from_file(cls, f, swapped=True):
         length, client, frame = binutils.read_data_fmt(f, 'iii')
@@ -47,14 +80,39 @@ class Packet:
         if length < 4:
             if length == 1:  # EOF marker (pre-footer)
                 return None
-            print(f'Invalid packet length {length} from client {client}: {f.read()}')
+            logging.error(f'Invalid packet length {length} from client {client}: {f.read()}')
             return None
         data = f.read(length - 4)
         if len(data) != length - 4:
-            print(f'Read only {len(data)} bytes out of {length - 4} from client {client}')
+            logging.error(f'Read only {len(data)} bytes out of {length - 4} from client {client}')
             return None
         return cls(client, frame, data)
 
+    @classmethod
+    def from_buffer(cls, buf, offset, swapped=True):
+        '''Parse the packet located at offset in buf (typically a memoryview
+        of a mmap) without copying its data; return the packet (or None) and
+        the offset of the next packet'''
+        header_size = cls._HEADER.size
+        if offset + header_size > len(buf):
+            raise ValueError(f'Read only {len(buf) - offset} bytes out of {header_size} requested')
+        length, client, frame = cls._HEADER.unpack_from(buf, offset)
+        offset += header_size
+
+        if swapped:
+            client, length = length, client
+
+        if length < 4:
+            if length == 1:  # EOF marker (pre-footer)
+                return None, offset
+            logging.error(f'Invalid packet length {length} from client {client}: {bytes(buf[offset:])}')
+            return None, len(buf)
+        end = offset + length - 4
+        if end > len(buf):
+            logging.error(f'Read only {len(buf) - offset} bytes out of {length - 4} from client {client}')
+            return None, len(buf)
+        return cls(client, frame, buf[offset:end]), end
+
     def send(self, s):
         s.send(struct.pack('ii', len(self.data) + 4, self.frame) + self.data)
 
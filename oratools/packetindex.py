@@ -0,0 +1,173 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import logging
+import os
+import os.path as op
+import struct
+
+from .cache import get_cache_dir
+
+
+class PacketIndex:
+
+    # index files are [magic:4][version:u32][replay size:i64][replay mtime:i64]
+    # followed by one [offset:i64][frame:i32][client:i32][length:i32] entry
+    # per packet
+    _MAGIC = b'ORPI'
+    _VERSION = 1
+    _HEADER = struct.Struct('<4sIqq')
+    _ENTRY = struct.Struct('<qiii')
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    @classmethod
+    def build(cls, demuxer):
+        entries = []
+        offset = 0
+        demuxer.seek(offset)
+        for pkt in demuxer.read_packet():
+            entries.append((offset, pkt.frame, pkt.client, len(pkt.data)))
+            offset = demuxer.tell()
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path, replay_stat):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        header_size = cls._HEADER.size
+        if len(data) < header_size or (len(data) - header_size) % cls._ENTRY.size:
+            return None
+        magic, version, size, mtime = cls._HEADER.unpack_from(data)
+        if (magic, version, size, mtime) != (cls._MAGIC, cls._VERSION, replay_stat.st_size, replay_stat.st_mtime_ns):
+            return None
+        return cls(list(cls._ENTRY.iter_unpack(memoryview(data)[header_size:])))
+
+    def save(self, path, replay_stat):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self._MAGIC, self._VERSION, replay_stat.st_size, replay_stat.st_mtime_ns))
+            f.write(b''.join(self._ENTRY.pack(*entry) for entry in self.entries))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _get_path(filename):
+        key = hashlib.sha1(op.abspath(filename).encode()).hexdigest()
+        return op.join(get_cache_dir('index'), key + '.idx')
+
+    @classmethod
+    def get_cached(cls, filename):
+        '''Load the index of the replay from the cache, None if there is no
+        up-to-date one'''
+        return cls.load(cls._get_path(filename), os.stat(filename))
+
+    def read_packet(self, demuxer, start_frame=None, end_frame=None):
+        '''Seek to and demux only the packets within [start_frame:end_frame]
+
+        Packets are not strictly ordered by frame in a replay, so the index is
+        used to find the first and last packets in the range, and the packets
+        in-between are filtered. The frame 0 packets (handshake, lobby sync)
+        located before the range are always honored since the decoder state
+        depends on them.'''
+        entries = self.entries
+        start = 0
+        end = len(entries)
+        if start_frame is not None:
+            start = next((i for i, e in enumerate(entries) if e[1] >= start_frame), end)
+        if end_frame is not None:
+            end = next((i + 1 for i in range(end - 1, start - 1, -1) if entries[i][1] <= end_frame), start)
+
+        for offset, frame, client, length in entries[:start]:
+            if frame != 0:
+                continue
+            demuxer.seek(offset)
+            yield from _take(demuxer.read_packet(), 1)
+
+        if start == end:
+            return
+        demuxer.seek(entries[start][0])
+        for pkt in _take(demuxer.read_packet(), end - start):
+            if start_frame is not None and pkt.frame < start_frame:
+                continue
+            if end_frame is not None and pkt.frame > end_frame:
+                continue
+            yield pkt
+
+
+def _take(packets, n):
+    for _, pkt in zip(range(n), packets):
+        yield pkt
+
+
+# Packets are not strictly ordered by frame: when reading a replay in order,
+# the packets of a frame may still come after the ones this many frames later
+_OUT_OF_ORDER_FRAMES = 32
+
+
+def _read_until(packets, end_frame):
+    '''Filter the packets demuxed in order up to end_frame, and stop once
+    they are past it'''
+    for pkt in packets:
+        if pkt.frame > end_frame + _OUT_OF_ORDER_FRAMES:
+            break
+        if pkt.frame <= end_frame:
+            yield pkt
+
+
+def _read_and_index(filename, demuxer, start_frame, end_frame):
+    '''Demux the whole replay in order, filtering the packets like
+    PacketIndex.read_packet() does, while building its index; the index is
+    stored once the replay is entirely read'''
+    logging.debug('Building packet index of %s', filename)
+    replay_stat = os.stat(filename)
+    entries = []
+    offset = 0
+    started = False
+    demuxer.seek(offset)
+    for pkt in demuxer.read_packet():
+        entries.append((offset, pkt.frame, pkt.client, len(pkt.data)))
+        offset = demuxer.tell()
+        started = started or pkt.frame >= start_frame
+        if not started:
+            if pkt.frame == 0:
+                yield pkt
+        elif pkt.frame >= start_frame and (end_frame is None or pkt.frame <= end_frame):
+            yield pkt
+    PacketIndex(entries).save(PacketIndex._get_path(filename), replay_stat)
+
+
+def read_packet(filename, demuxer, decoder, args):
+    '''Packets iterator honoring the --from/--until options'''
+    if args.start is None and args.until is None:
+        return demuxer.read_packet()
+    start_frame = decoder.get_frame_id(args.start) if args.start is not None else None
+    end_frame = decoder.get_frame_id(args.until) if args.until is not None else None
+    index = PacketIndex.get_cached(filename)
+    if index is not None:
+        return index.read_packet(demuxer, start_frame, end_frame)
+
+    # Without an index, the replay is read in order rather than paying an
+    # extra demux pass to build one. The beginning of the replay is read
+    # anyway so only --from gets the index built along, for the next runs.
+    if start_frame is None:
+        return _read_until(demuxer.read_packet(), end_frame)
+    return _read_and_index(filename, demuxer, start_frame, end_frame)
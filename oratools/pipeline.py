@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+from . import cache, jsonl, packetindex
+from .decoder import Decoder, OrdersFilter
+from .demuxer import FileDemuxer
+
+
+class Analyzer:
+    '''Analysis subscribing to the (packet, order) events of a replay'''
+
+    NAME = None
+
+    # Orders the analyzer is interested in (see decoder.OrdersFilter), None
+    # for all of them
+    ORDERS_FILTER = None
+
+    # Names of the arguments the result depends on
+    OPTIONS = ()
+
+    def __init__(self, decoder, args=None):
+        self._dec = decoder
+        self._args = args
+        # Set by the analyzer once it does not need any more order; the
+        # replay stops being demuxed when all the analyzers are done
+        self.done = False
+
+    def feed(self, pkt, order):
+        raise NotImplementedError
+
+    def get_result(self):
+        '''Result of the analysis, must be JSON serializable'''
+        raise NotImplementedError
+
+    @staticmethod
+    def render(result):
+        raise NotImplementedError
+
+    @staticmethod
+    def get_json_entries(result):
+        '''Flatten the result into JSON objects (dicts), one per entry'''
+        raise NotImplementedError
+
+
+def _analyze(filename, args, analyzer_classes):
+    orders_filters = [cls.ORDERS_FILTER for cls in analyzer_classes]
+    decoder_filter = None if None in orders_filters else set().union(*orders_filters)
+
+    with open(filename, 'rb') as f:
+        fmt = FileDemuxer(f, args.forced_version, args.mmap)
+
+        # Orders are decoded lazily: analyzers which do not need their info
+        # (such as the stats) do not pay for it
+        dec = Decoder(fmt.game_info, decoder_filter, lazy=True)
+
+        subscriptions = []
+        for cls in analyzer_classes:
+            orders_filter = OrdersFilter(cls.ORDERS_FILTER) if cls.ORDERS_FILTER is not None else None
+            subscriptions.append((cls(dec, args), orders_filter))
+
+        error = None
+        active = subscriptions
+        try:
+            for pkt in packetindex.read_packet(filename, fmt, dec, args):
+                for order in dec.decode_packet(pkt):
+                    for analyzer, orders_filter in active:
+                        if orders_filter is None or orders_filter.match(order):
+                            analyzer.feed(pkt, order)
+                            if analyzer.done:
+                                active = [sub for sub in active if not sub[0].done]
+                if not active:
+                    break
+        except ValueError as e:
+            error = str(e)
+
+        results = {analyzer.NAME: analyzer.get_result() for analyzer, _ in subscriptions}
+        return dict(results=results, error=error)
+
+
+def get_results(filename, args, analyzer_classes):
+    '''Run all the analyzers over a single demux and decode pass of the
+    replay (or get their results from the cache)'''
+    name = ','.join(cls.NAME for cls in analyzer_classes)
+    options = [opt for cls in analyzer_classes for opt in cls.OPTIONS]
+    return cache.get_result(filename, args, name,
+                            lambda filename, args: _analyze(filename, args, analyzer_classes), options)
+
+
+def run(filename, args, analyzer_classes):
+    '''Run all the analyzers over the replay and render their results'''
+    result = get_results(filename, args, analyzer_classes)
+    if result['error'] is not None:
+        logging.error(result['error'])
+    if args.format == 'jsonl':
+        writer = jsonl.get_writer()
+        for cls in analyzer_classes:
+            for entry in cls.get_json_entries(result['results'][cls.NAME]):
+                writer.write(dict(replay=filename, **entry))
+        return
+    for cls in analyzer_classes:
+        if len(analyzer_classes) > 1:
+            logging.info(f'=== {cls.NAME} ===')
+        cls.render(result['results'][cls.NAME])
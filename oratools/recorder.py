@@ -0,0 +1,216 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import datetime
+import logging
+import struct
+
+from . import miniyaml
+from .decoder import Decoder
+from .demuxer import AsyncSocketDemuxer, FileDemuxer
+
+
+class ReplayWriter:
+    '''Incremental replay writer: the packets are written as they come (in
+    the layout read by FileDemuxer) and the footer at close'''
+
+    _FOOTER_VERSION = 1
+
+    def __init__(self, output_file):
+        self._output_file = output_file
+        self.last_frame = 0
+
+    def write_packet(self, pkt):
+        self._output_file.write(pkt.to_bytes())
+        self.last_frame = max(self.last_frame, pkt.frame)
+
+    def close(self, game_info):
+        yaml = miniyaml.serialize(game_info)
+        game_data = struct.pack('<i', len(yaml)) + yaml
+        self._output_file.write(struct.pack('<ii', FileDemuxer.START_MARKER, self._FOOTER_VERSION))
+        self._output_file.write(game_data)
+        self._output_file.write(struct.pack('<ii', len(game_data), FileDemuxer.END_MARKER))
+        self._output_file.flush()
+
+
+class Subscription:
+    '''Packets stream of a FanOut subscriber, with the same read_packet()
+    interface as AsyncSocketDemuxer'''
+
+    def __init__(self, maxsize, blocking):
+        self.queue = asyncio.Queue(maxsize)
+        self.blocking = blocking
+
+    async def read_packet(self):
+        while True:
+            packet = await self.queue.get()
+            if packet is None:
+                break
+            yield packet
+
+
+class FanOut:
+    '''Dispatch the packets of a single live stream to several subscribers
+    through bounded queues. A blocking subscriber slows down the stream when
+    its queue is full, while a non-blocking one is dropped (its stream ends
+    right away).'''
+
+    def __init__(self):
+        self._subscriptions = []
+
+    def subscribe(self, maxsize=1024, blocking=False):
+        subscription = Subscription(maxsize, blocking)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        '''Stop dispatching the packets to the subscription; its pending
+        packets are discarded, which unblocks a publish() waiting on it'''
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+
+    def _drop(self, subscription):
+        logging.warning('dropping a subscriber not keeping up with the stream')
+        self.unsubscribe(subscription)
+        subscription.queue.put_nowait(None)
+
+    async def publish(self, pkt):
+        for subscription in list(self._subscriptions):
+            queue = subscription.queue
+            if subscription.blocking:
+                await queue.put(pkt)
+                continue
+            if queue.full():
+                # Give the subscriber a chance to catch up before dropping it
+                await asyncio.sleep(0)
+                if queue.full():
+                    self._drop(subscription)
+                    continue
+            queue.put_nowait(pkt)
+
+    async def close(self):
+        for subscription in list(self._subscriptions):
+            queue = subscription.queue
+            if subscription.blocking:
+                await queue.put(None)
+            elif queue.full():
+                self._drop(subscription)
+            else:
+                queue.put_nowait(None)
+        self._subscriptions = []
+
+
+async def serve_subscribers(fanout, host, port):
+    '''Forward the stream to the clients connecting to (host, port), in the
+    received packets layout (readable with SocketDemuxer). Clients only get
+    the packets published after they connected.'''
+
+    async def handle(reader, writer):
+        subscription = fanout.subscribe()
+        try:
+            async for pkt in subscription.read_packet():
+                writer.write(pkt.to_bytes(swapped=False))
+                await writer.drain()
+        except ConnectionError:
+            fanout.unsubscribe(subscription)
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def _get_game_info(version, decoder, start_time, last_frame):
+    time_fmt = '%Y-%m-%d %H:%M:%S'
+    root = {
+        'Version': version,
+        'StartTimeUtc': start_time.strftime(time_fmt),
+        'EndTimeUtc': datetime.datetime.utcnow().strftime(time_fmt),
+        'FinalGameTick': str(decoder.get_frame_tick(last_frame)),
+    }
+    game_info = {'Root': root}
+    for client_id, name in decoder.get_client_names().items():
+        game_info[f'Player@{client_id}'] = {'Name': name, 'ClientIndex': str(client_id)}
+    return game_info
+
+
+async def record(demuxer, output_file, version, fanout=None):
+    '''Record the live game read from demuxer into output_file, and dispatch
+    its packets to the fanout subscribers'''
+    writer = ReplayWriter(output_file)
+    # Only tracking the clients, for the players of the footer
+    decoder = Decoder({'Root': {'Version': version}}, {b'SyncInfo'})
+    start_time = datetime.datetime.utcnow()
+    try:
+        async for pkt in demuxer.read_packet():
+            writer.write_packet(pkt)
+            for _ in decoder.decode_packet(pkt):
+                pass
+            if fanout is not None:
+                await fanout.publish(pkt)
+    finally:
+        writer.close(_get_game_info(version, decoder, start_time, writer.last_frame))
+        if fanout is not None:
+            await fanout.close()
+
+
+async def _show_chat(fanout, subscription, version):
+    from .chat import ChatAnalyzer
+    from .live import run_session
+
+    decoder = Decoder({'Root': {'Version': version}}, ChatAnalyzer.ORDERS_FILTER)
+    analyzer = ChatAnalyzer(decoder)
+
+    def feed(pkt, order):
+        analyzer.feed(pkt, order)
+        dialogues = analyzer.get_result()
+        if dialogues:
+            ChatAnalyzer.render(dialogues[-1:])
+            dialogues.clear()
+
+    try:
+        await run_session(subscription, decoder, feed)
+    finally:
+        # The stream must not wait for a chat display which is gone
+        fanout.unsubscribe(subscription)
+
+
+async def _record(args):
+    demuxer = await AsyncSocketDemuxer.connect(args.server, args.port, args.timeout)
+    fanout = FanOut()
+    tasks = []
+    server = None
+    if args.chat:
+        tasks.append(asyncio.create_task(_show_chat(fanout, fanout.subscribe(blocking=True), args.version)))
+    if args.listen is not None:
+        server = await serve_subscribers(fanout, 'localhost', args.listen)
+    try:
+        with open(args.output, 'wb') as f:
+            await record(demuxer, f, args.version, fanout)
+        await asyncio.gather(*tasks)
+    finally:
+        await demuxer.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+def recorder(args):
+    asyncio.run(_record(args))
@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import itertools
+import logging
+import time
+
+from .decoder import Decoder
+from .demuxer import FileDemuxer
+
+
+class Playback:
+    '''Packets of a replay, pre-serialized in the received layout and grouped
+    in chunks to send at the same time'''
+
+    def __init__(self, filename, chunks):
+        self.filename = filename
+        # (time in seconds, data) pairs
+        self.chunks = chunks
+
+    @classmethod
+    def load(cls, filename, forced_version=None, use_mmap=False):
+        with open(filename, 'rb') as f:
+            fmt = FileDemuxer(f, forced_version, use_mmap)
+            dec = Decoder(fmt.game_info)
+            chunks = []
+            data = []
+            chunk_frame = 0
+            # Packets of a frame are interleaved with late ones from the
+            # previous frames, so the time is based on the latest frame seen
+            for pkt in fmt.read_packet():
+                if pkt.frame > chunk_frame:
+                    if data:
+                        chunks.append((dec.get_tick_ms(dec.get_frame_tick(chunk_frame)) / 1000, b''.join(data)))
+                        data = []
+                    chunk_frame = pkt.frame
+                data.append(pkt.to_bytes(swapped=False))
+            if data:
+                chunks.append((dec.get_tick_ms(dec.get_frame_tick(chunk_frame)) / 1000, b''.join(data)))
+        return cls(filename, chunks)
+
+    async def send(self, writer, speed):
+        '''Send the packets in real time accelerated by speed, or as fast as
+        possible if speed is 0'''
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for t, data in self.chunks:
+            if speed:
+                delay = start + t / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+
+
+async def start_server(playbacks, host, port, speed):
+    '''Serve the playbacks (in turn) to the connecting clients'''
+    next_playback = itertools.cycle(playbacks)
+
+    async def handle(reader, writer):
+        playback = next(next_playback)
+        peer = writer.get_extra_info('peername')
+        t0 = time.perf_counter()
+        try:
+            await playback.send(writer, speed)
+        except ConnectionError as e:
+            logging.warning(f'{peer}: {playback.filename}: {e}')
+            return
+        finally:
+            writer.close()
+        logging.info(f'{peer}: {playback.filename} sent in {time.perf_counter() - t0:.3f}s')
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def _serve(playbacks, args):
+    server = await start_server(playbacks, args.host, args.port, args.speed)
+    logging.info(f'Serving {len(playbacks)} replay(s) on {args.host}:{args.port}')
+    async with server:
+        await server.serve_forever()
+
+
+def serve(replays, args):
+    playbacks = []
+    for replay in replays:
+        logging.info(f'Loading {replay}')
+        try:
+            playbacks.append(Playback.load(replay, args.forced_version, args.mmap))
+        except Exception:
+            logging.error('unable to read %s', replay)
+    if not playbacks:
+        logging.error('no replay to serve')
+        return
+    try:
+        asyncio.run(_serve(playbacks, args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,50 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+
+from . import pipeline
+
+
+class StatsAnalyzer(pipeline.Analyzer):
+    '''Histogram of the orders, by type (and field name for Fields orders)'''
+
+    NAME = 'stats'
+
+    def __init__(self, decoder, args=None):
+        super().__init__(decoder, args)
+        self._histogram = {}
+
+    def feed(self, pkt, order):
+        key = f'{order.type}:{order.field.decode()}' if order.type == 'Fields' else order.type
+        self._histogram[key] = self._histogram.get(key, 0) + 1
+
+    def get_result(self):
+        return sorted(self._histogram.items(), key=lambda item: (-item[1], item[0]))
+
+    @staticmethod
+    def render(histogram):
+        if not histogram:
+            return
+        total = sum(count for _, count in histogram)
+        for key, count in histogram:
+            logging.info(f'{count:>8} {count * 100 / total:6.2f}%  {key}')
+
+    @staticmethod
+    def get_json_entries(histogram):
+        for key, count in histogram:
+            yield dict(type='stats', order=key, count=count)
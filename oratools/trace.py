@@ -18,21 +18,37 @@
 import logging
 import pprint
 
+from . import jsonl, packetindex
 from .decoder import Decoder
 from .demuxer import FileDemuxer
 
 
+def _trace_jsonl(filename, fmt, dec, args):
+    writer = jsonl.get_writer()
+    writer.write(dict(replay=filename, type='game_info', game_info=fmt.game_info))
+    for pkt in packetindex.read_packet(filename, fmt, dec, args):
+        writer.write(dict(replay=filename, type='packet', client=pkt.client, frame=pkt.frame, datalen=len(pkt.data)))
+        for order in dec.decode_packet(pkt):
+            writer.write(dict(replay=filename, type='order', client=pkt.client, frame=pkt.frame,
+                              order=order.type, **order.as_dict()))
+
+
 def trace(filename, args):
     orders_filter = args.filter
     with open(filename, 'rb') as f:
-        fmt = FileDemuxer(f, args.forced_version)
-        dec = Decoder(fmt.game_info)
+        fmt = FileDemuxer(f, args.forced_version, args.mmap)
+        dec = Decoder(fmt.game_info, {orders_filter} if orders_filter else None)
+        if args.format == 'jsonl':
+            try:
+                _trace_jsonl(filename, fmt, dec, args)
+            except ValueError as e:
+                logging.error(e)
+            return
         logging.info(f'Game info: {pprint.pformat(fmt.game_info)}')
         try:
-            for pkt in fmt.read_packet():
+            for pkt in packetindex.read_packet(filename, fmt, dec, args):
                 logging.info(f'PKT {pkt}')
                 for order in dec.decode_packet(pkt):
-                    if orders_filter is None or order.type == orders_filter:
-                        logging.info(f'  ORD {order}')
+                    logging.info(f'  ORD {order}')
         except ValueError as e:
             logging.error(e)
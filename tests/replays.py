@@ -0,0 +1,83 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''Synthetic replays for the tests'''
+
+import struct
+
+from oratools import csharp
+from oratools.decoder import OrderFields
+from oratools.packet import Packet
+from oratools.recorder import ReplayWriter
+
+
+_TARGETS = (b'powr', b'tent', b'proc', b'weap')
+
+
+def _fields(field, flags, data):
+    return b'\xff' + csharp.serialize_string(field) + struct.pack('<h', flags) + data
+
+
+def _production(field, target, count):
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_TARGETSTRING | OrderFields._FLAG_EXTRADATA
+    return _fields(field, flags, struct.pack('<I', 1) + csharp.serialize_string(target) + struct.pack('<I', count))
+
+
+def get_packets(nb_frames=300, names=('alice', 'bob')):
+    '''Lobby packets followed by a game where every client regularly builds,
+    chats, creates groups and reports its sync state'''
+    handshake = csharp.serialize_string(b'Handshake:\n\tOrdersProtocol: 11\n')
+    sync_info = b''.join(b'Client@%d:\n\tName: %s\n' % (client, name.encode())
+                         for client, name in enumerate(names, 1))
+    packets = [
+        Packet(0, 0, b'\xfe' + csharp.serialize_string(b'HandshakeResponse') + handshake),
+        Packet(0, 0, _fields(b'SyncInfo', OrderFields._FLAG_TARGETSTRING, csharp.serialize_string(sync_info))),
+    ]
+    group_flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_GROUPED
+    for frame in range(1, nb_frames):
+        for client in range(1, len(names) + 1):
+            target = _TARGETS[(frame // 10 + client) % len(_TARGETS)]
+            if frame % 10 == 1:
+                packets.append(Packet(client, frame, _production(b'StartProduction', target, 1)))
+            elif frame % 10 == 6:
+                packets.append(Packet(client, frame, _production(b'PlaceBuilding', target, 0)))
+            elif frame % 50 == 3 + client:
+                chat = csharp.serialize_string(b'hello %d' % frame)
+                packets.append(Packet(client, frame, _fields(b'Chat', OrderFields._FLAG_TARGETSTRING, chat)))
+            elif frame % 7 == client:
+                actors = range(frame % 5)
+                data = struct.pack(f'<Ii{len(actors)}I', frame, len(actors), *actors)
+                packets.append(Packet(client, frame, _fields(b'CreateGroup', group_flags, data)))
+            packets.append(Packet(client, frame, b'\x65' + struct.pack('<IQ', frame * 31, 0)))
+    return packets
+
+
+def get_game_info(names=('alice', 'bob'), nb_frames=300, map_title='Test Map'):
+    game_info = {'Root': {'Version': 'test', 'MapTitle': map_title, 'FinalGameTick': str(nb_frames * 3)}}
+    for client, name in enumerate(names, 1):
+        game_info[f'Player@{client}'] = {
+            'Name': name, 'ClientIndex': str(client), 'Outcome': 'Won' if client == 1 else 'Lost',
+        }
+    return game_info
+
+
+def write_replay(path, nb_frames=300, names=('alice', 'bob'), map_title='Test Map'):
+    with open(path, 'wb') as f:
+        writer = ReplayWriter(f)
+        for pkt in get_packets(nb_frames, names):
+            writer.write_packet(pkt)
+        writer.close(get_game_info(names, nb_frames, map_title))
@@ -0,0 +1,67 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from oratools.activity import ActivityAnalyzer
+from oratools.decoder import Decoder
+from oratools.packet import Packet
+
+
+class _Order:
+    type = 'Fields'
+
+    def __init__(self, field):
+        self.field = field
+
+
+def test_activity():
+    rnd = random.Random(0)
+    dec = Decoder({'Root': {'Version': 'test'}})
+    analyzer = ActivityAnalyzer(dec, argparse.Namespace(bin_size=30))
+    fields = [b'Move', b'CreateGroup', b'AttackMove', b'Chat']
+    events = []
+    for frame in range(0, 5000, 3):
+        client = rnd.choice([1, 2, 5])
+        field = rnd.choice(fields)
+        analyzer.feed(Packet(client, frame, b''), _Order(field))
+        if field != b'Chat':
+            events.append((client, frame, field))
+
+    result = analyzer.get_result()
+    assert sorted(result['fields']) == ['AttackMove', 'CreateGroup', 'Move']
+    assert [client['client'] for client in result['clients']] == [1, 2, 5]
+    for entry in result['clients']:
+        actions = [0] * len(entry['actions'])
+        create_group = [0] * len(entry['actions'])
+        mix = dict.fromkeys(result['fields'], 0)
+        for client, frame, field in events:
+            if client != entry['client']:
+                continue
+            m, s = dec.get_frame_time(frame).split(':')
+            slot = int((int(m) * 60 + float(s)) // 30)
+            actions[slot] += 1
+            create_group[slot] += field == b'CreateGroup'
+            mix[field.decode()] += 1
+        assert entry['actions'] == actions
+        assert entry['create_group'] == create_group
+        assert dict(zip(result['fields'], entry['mix'])) == mix
@@ -0,0 +1,101 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+
+from oratools.buildorder import BuildOrderAnalyzer, ClientQueues, ProductionQueue
+
+
+class _ReferenceQueue:
+    '''Historical flat list implementation'''
+
+    def __init__(self):
+        self._queue = []
+
+    def _find(self, target):
+        for i, (qframe, qtarget, qcount) in enumerate(self._queue):
+            if qtarget == target:
+                return i
+        return -1
+
+    def start(self, frame, target, count):
+        self._queue.append((frame, target, count))
+
+    def complete(self, target):
+        i = self._find(target)
+        if i == -1:
+            return None
+        start_frame = self._queue[i][0]
+        self.cancel(target, 1)
+        return start_frame
+
+    def cancel(self, target, count):
+        i = self._find(target)
+        if i == -1:
+            return
+        qframe, qtarget, qcount = self._queue[i]
+        remain = qcount - count
+        if remain <= 0:
+            self._queue.pop(i)
+            if remain:
+                self.cancel(target, -remain)
+        else:
+            self._queue[i] = (qframe, qtarget, remain)
+
+    def get_items(self):
+        return self._queue
+
+
+def test_reference():
+    rnd = random.Random(0)
+    targets = [b'powr', b'tent', b'proc', b'weap']
+    ref, queue = _ReferenceQueue(), ProductionQueue()
+    for frame in range(5000):
+        op = rnd.random()
+        target = rnd.choice(targets)
+        if op < 0.4:
+            count = rnd.choice([0, 1, 1, 1, 2, 5])
+            ref.start(frame, target, count)
+            queue.start(frame, target, count)
+        elif op < 0.8:
+            assert ref.complete(target) == queue.complete(target)
+        else:
+            count = rnd.choice([1, 2, 3, 10])
+            ref.cancel(target, count)
+            queue.cancel(target, count)
+        assert sorted(ref.get_items()) == sorted(queue.get_items())
+
+
+def test_client_queues():
+    client_queues = ClientQueues()
+    client_queues.get(b'powr').start(1, b'powr', 1)
+    client_queues.get(b'e1').start(2, b'e1', 5)
+    client_queues.get(b'1tnk').start(3, b'1tnk', 1)
+    assert sorted(client_queues.queues) == ['Building', 'Infantry', 'Vehicle']
+    assert client_queues.queues['Infantry'].get_items() == [(2, b'e1', 5)]
+    assert client_queues.get(b'tent').complete(b'tent') is None
+    assert client_queues.get(b'powr').complete(b'powr') == 1
+
+
+def test_json_entries():
+    result = dict(frame_ms=120, builds=[
+        dict(client=1, name='foo', steps=[(10, 520, 'powr', 'Building'), (30, 1000, 'e1', 'Infantry')]),
+    ])
+    assert list(BuildOrderAnalyzer.get_json_entries(result)) == [
+        dict(type='build', name='foo', start='00:01.200', end='01:02.400', target='powr', queue='Building'),
+        dict(type='build', name='foo', start='00:03.600', end='02:00.000', target='e1', queue='Infantry'),
+    ]
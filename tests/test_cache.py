@@ -0,0 +1,109 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import itertools
+import os.path as op
+
+from oratools import cache
+
+
+def _fake_clock(monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache.time, 'time', lambda: next(clock))
+
+
+def test_eviction(tmp_path, monkeypatch):
+    _fake_clock(monkeypatch)
+    value = 'x' * 98  # 100 bytes once JSON encoded
+    result_cache = cache.ResultCache(str(tmp_path / 'results.sqlite'), 1000)
+    for i in range(10):
+        result_cache.put(f'k{i}', value)
+    assert all(result_cache.get(f'k{i}') == value for i in range(10))
+
+    # k0 is now the most recently used; going over the maximum size evicts
+    # the least recently used results down to 90% of it
+    assert result_cache.get('k0') == value
+    result_cache.put('k10', value)
+    present = [i for i in range(11) if result_cache.get(f'k{i}') is not None]
+    assert present == [0, 3, 4, 5, 6, 7, 8, 9, 10]
+
+    # No eviction while within the maximum size
+    result_cache.put('k11', value)
+    assert result_cache.get('k3') == value
+    result_cache.close()
+
+
+def test_get_result(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache, '_result_cache', None)
+    replay = tmp_path / 'test.orarep'
+    replay.write_bytes(b'replay data')
+
+    calls = []
+
+    def compute(filename, args):
+        calls.append((args.start, args.max_steps))
+        return len(calls)
+
+    def get_result(**options):
+        args = argparse.Namespace(no_cache=False, cache_size=1, forced_version=None, start=None, until=None,
+                                  max_steps=None)
+        vars(args).update(options)
+        return cache.get_result(str(replay), args, 'test', compute, ('max_steps',))
+
+    assert get_result() == 1
+    assert get_result() == 1
+    assert get_result(max_steps=3) == 2
+    assert get_result(max_steps=3) == 2
+    assert get_result(start='10') == 3
+    assert get_result(start='10', max_steps=3) == 4
+    assert get_result() == 1
+
+    # Any change of the replay invalidates its results
+    replay.write_bytes(b'other replay data')
+    assert get_result() == 5
+    assert len(calls) == 5
+
+
+def test_scan_state(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    replays = []
+    for i in range(3):
+        replay = tmp_path / f'test{i}.orarep'
+        replay.write_bytes(b'replay data')
+        replays.append(str(replay))
+    missing = str(tmp_path / 'missing.orarep')
+
+    # Duplicated and unreadable targets are only reported once
+    scan_state = cache.ScanState('test')
+    changed = list(scan_state.filter_changed(replays + [missing, replays[0], op.relpath(replays[1])]))
+    assert changed == replays
+    for replay in changed[:2]:
+        scan_state.mark_done(replay)
+    scan_state.close()
+
+    scan_state = cache.ScanState('test')
+    assert list(scan_state.filter_changed(replays)) == replays[2:]
+    scan_state.close()
+
+    # Any change of a replay makes it processed again
+    with open(replays[0], 'ab') as f:
+        f.write(b'more data')
+    scan_state = cache.ScanState('test')
+    assert list(scan_state.filter_changed(replays)) == [replays[0], replays[2]]
+    scan_state.close()
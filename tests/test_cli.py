@@ -0,0 +1,86 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import os.path as op
+import subprocess
+import sys
+
+from replays import write_replay
+
+
+def run_cli(tmp_path, *args):
+    '''Run the command line tool, return its (stdout, log lines)'''
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    proc = subprocess.run([sys.executable, '-c', 'from oratools.cli import run; run()', *args],
+                          cwd=op.dirname(op.dirname(op.abspath(__file__))), env=env, capture_output=True, check=True)
+    return proc.stdout, proc.stderr.decode().splitlines()
+
+
+def write_replays(tmp_path):
+    '''Several replays with distinct player names, one of them corrupt'''
+    replays = []
+    for i in range(4):
+        path = str(tmp_path / f'r{i}.orarep')
+        if i == 2:
+            with open(path, 'wb') as f:
+                f.write(b'\x00' * 100)
+        else:
+            write_replay(path, names=(f'alice{i}', f'bob{i}'))
+        replays.append(path)
+    return replays
+
+
+def test_jobs(tmp_path):
+    replays = write_replays(tmp_path)
+    _, lines = run_cli(tmp_path, 'chat', '--no-cache', *replays)
+    _, parallel_lines = run_cli(tmp_path, 'chat', '--no-cache', '-j', '2', *replays)
+
+    # Same output as the serial run: in the replays order, with the log
+    # lines of every replay grouped after its header
+    assert parallel_lines == lines
+    groups = {}
+    for line in lines:
+        if line.startswith('Replay: '):
+            replay = line[len('Replay: '):]
+            groups[replay] = []
+        else:
+            groups[replay].append(line)
+    assert list(groups) == replays
+
+    # The corrupt replay is reported without affecting the others
+    assert groups[replays[2]] == [f'unable to read {replays[2]}']
+    for i in (0, 1, 3):
+        assert groups[replays[i]]
+        assert all(f'alice{i}>' in line or f'bob{i}>' in line for line in groups[replays[i]])
+
+
+def test_jsonl_jobs(tmp_path):
+    replays = write_replays(tmp_path)
+    output, _ = run_cli(tmp_path, 'analyze', '--chat', '--buildorder', '--no-cache', '--format', 'jsonl', *replays)
+    parallel_output, _ = run_cli(tmp_path, 'analyze', '--chat', '--buildorder', '--no-cache', '--format', 'jsonl',
+                                 '-j', '2', *replays)
+    assert parallel_output == output
+
+    # One JSON object per line, grouped by replay in the replays order
+    entries = [json.loads(line) for line in output.decode().splitlines()]
+    assert all(isinstance(entry, dict) for entry in entries)
+    replays_order = [replay for i, replay in enumerate(entry['replay'] for entry in entries)
+                     if i == 0 or entries[i - 1]['replay'] != replay]
+    assert replays_order == [replays[0], replays[1], replays[3]]
+    assert {entry['type'] for entry in entries} == {'chat', 'build'}
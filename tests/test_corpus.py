@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import logging
+import sqlite3
+
+from oratools import corpus
+
+from replays import write_replay
+
+
+def _index(replays, db, caplog):
+    '''Index the replays, return the ones actually processed'''
+    caplog.clear()
+    args = argparse.Namespace(db=db, jobs=1, no_cache=True, cache_size=1, forced_version=None, mmap=False,
+                              start=None, until=None)
+    corpus.index(replays, args)
+    return [msg[len('Replay: '):] for msg in caplog.messages if msg.startswith('Replay: ')]
+
+
+def _query(db, caplog, player=None, map=None, version=None, chat=None):
+    '''Paths of the replays matching the query'''
+    caplog.clear()
+    corpus.query(argparse.Namespace(db=db, player=player, map=map, version=version, chat=chat))
+    return [msg for msg in caplog.messages if not msg.startswith(' ')]
+
+
+def test_index(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    db = str(tmp_path / 'corpus.sqlite')
+    replays = [str(tmp_path / 'r0.orarep'), str(tmp_path / 'r1.orarep')]
+    write_replay(replays[0], names=('alice', 'bob'), map_title='Map A')
+    write_replay(replays[1], names=('carol', 'bob'), map_title='Map B')
+
+    assert _index(replays, db, caplog) == replays
+    assert _index(replays, db, caplog) == []
+
+    # Only the changed replay is indexed again, replacing its previous rows
+    write_replay(replays[1], nb_frames=200, names=('carol', 'dave'), map_title='Map B')
+    assert _index(replays, db, caplog) == [replays[1]]
+    with sqlite3.connect(db) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM replays').fetchone() == (2,)
+        players = conn.execute('SELECT name, outcome FROM players JOIN replays ON replays.id = replay_id '
+                               'WHERE path = ? ORDER BY client_index', (replays[1],)).fetchall()
+        assert players == [('carol', 'Won'), ('dave', 'Lost')]
+        assert conn.execute('SELECT COUNT(*) FROM builds WHERE name = ?', ('alice',)).fetchone()[0] > 0
+
+    assert _query(db, caplog) == replays
+    assert _query(db, caplog, player=['bob']) == [replays[0]]
+    assert _query(db, caplog, player=['%a%', 'bob']) == [replays[0]]
+    assert _query(db, caplog, player=['dave']) == [replays[1]]
+    assert _query(db, caplog, map='%B') == [replays[1]]
+    assert _query(db, caplog, version='test') == replays
+    assert _query(db, caplog, version='other') == []
+    assert _query(db, caplog, chat='hello 254') == [replays[0]]
+    assert _query(db, caplog, chat='hello 154') == replays
@@ -0,0 +1,104 @@
+import struct
+
+import pytest
+
+from oratools import csharp
+from oratools.decoder import Decoder, OrderFields, OrderFieldsView, OrderSyncHash, target_string_cache_info
+from oratools.packet import Packet
+
+
+def _fields(field, flags, payload):
+    return csharp.serialize_string(field) + struct.pack('<h', flags) + payload
+
+
+def test_fields():
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_EXTRAACTORS | OrderFields._FLAG_GROUPED
+    data = _fields(b'CreateGroup', flags, struct.pack('<Ii3Ii2I', 4, 3, 98, 100, 102, 2, 7, 8))
+    for buf in (data, memoryview(data)):
+        order = OrderFields.from_data(buf, None, 11)
+        assert order.field == b'CreateGroup'
+        assert order.info == {
+            'subject_id': 4,
+            'extra_actors': (98, 100, 102),
+            'grouped_actors': (7, 8),
+        }
+
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_TARGETSTRING | OrderFields._FLAG_EXTRADATA
+    data = _fields(b'StartProduction', flags, struct.pack('<I', 5) + csharp.serialize_string(b'powr') + struct.pack('<I', 2))
+    order = OrderFields.from_data(data, None, 11)
+    assert order.info == {'subject_id': 5, 'target': b'powr', 'extra_data': 2}
+
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_TARGET | OrderFields._FLAG_TARGETISCELL
+    data = _fields(b'Move', flags, struct.pack('<IBib', 7, OrderFields._TARGET_TYPE_TERRAIN, 1234, 0))
+    order = OrderFields.from_data(data, None, 11)
+    assert order.info == {'subject_id': 7, 'cell': 1234, 'sub_cell': 0}
+
+    flags = OrderFields._FLAG_TARGET | OrderFields._FLAG_EXTRALOCATION
+    data = _fields(b'Attack', flags, struct.pack('<BIi', OrderFields._TARGET_TYPE_ACTOR, 12, -3))
+    order = OrderFields.from_data(data, None, 11)
+    assert order.info == {'target_actor_id': 12, 'extra_location': -3}
+
+    # Older protocols: subject before the (single byte) flags, then after
+    data = csharp.serialize_string(b'Attack') + struct.pack('<IBBII', 9, OrderFields._FLAG_TARGET,
+                                                             OrderFields._TARGET_TYPE_FROZEN_ACTOR, 1, 2)
+    order = OrderFields.from_data(data, None, 7)
+    assert order.info == {'subject_id': 9, 'player_actor_id': 1, 'frozen_actor_id': 2}
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_TARGET
+    data = csharp.serialize_string(b'Move') + struct.pack('<BIBiii', flags, 9, OrderFields._TARGET_TYPE_TERRAIN, 1, 2, 3)
+    order = OrderFields.from_data(data, None, 10)
+    assert order.info == {'subject_id': 9, 'pos': (1, 2, 3)}
+
+
+def test_sync_hash():
+    data = struct.pack('<IQ', 0xdeadbeef, 3)
+    order = OrderSyncHash.from_data(data, None, 11)
+    assert (order.sync_hash, order.defeat_state) == (0xdeadbeef, 3)
+    order = OrderSyncHash.from_data(data, None, 10)
+    assert (order.sync_hash, order.defeat_state) == (0xdeadbeef, None)
+
+
+def test_string():
+    for s in (b'', b'foo', b'x' * 300):
+        data = csharp.serialize_string(s) + b'trailing'
+        assert csharp.parse_string(data) == (s, len(data) - len(b'trailing'))
+
+
+def test_orders_filter():
+    sync_info = csharp.serialize_string(b'Client@1:\n\tName: foo\n')
+    packets = [
+        Packet(0, 0, b'\xff' + _fields(b'SyncInfo', OrderFields._FLAG_TARGETSTRING, sync_info)),
+        Packet(1, 1, b'\xff' + _fields(b'Chat', OrderFields._FLAG_TARGETSTRING, csharp.serialize_string(b'hi'))),
+        Packet(1, 2, b'\xff' + _fields(b'Stop', OrderFields._FLAG_SUBJECT, struct.pack('<I', 3))),
+        Packet(1, 3, b'\x65' + struct.pack('<IQ', 1, 0)),
+    ]
+    dec = Decoder({'Root': {'Version': 'test'}}, {b'Chat', 'SyncHash'})
+    dec._orders_version = 11
+    orders = [order for pkt in packets for order in dec.decode_packet(pkt)]
+    assert [order.type for order in orders] == ['Fields', 'SyncHash']
+    assert orders[0].field == b'Chat'
+    assert dec.get_name(1) == 'foo'
+
+
+def test_lazy():
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_GROUPED
+    pkt = Packet(1, 1, b'\xff' + _fields(b'CreateGroup', flags, struct.pack('<Ii2I', 4, 2, 7, 8)))
+    dec = Decoder({'Root': {'Version': 'test'}}, lazy=True)
+    dec._orders_version = 11
+    order, = dec.decode_packet(pkt)
+    assert isinstance(order, OrderFieldsView)
+    assert (order.type, order.field) == ('Fields', b'CreateGroup')
+    assert order._info is None
+    assert order.info == {'subject_id': 4, 'grouped_actors': (7, 8)}
+    assert not hasattr(order, '__dict__')
+
+
+def test_target_string_cache():
+    target = csharp.serialize_string(b'Client@1:\n\tName: foo\nClient@2:\n\tName: bar\n')
+    data = _fields(b'SyncLobbyClients', OrderFields._FLAG_TARGETSTRING, target)
+    hits = target_string_cache_info().hits
+    order0 = OrderFields.from_data(data, None, 11)
+    order1 = OrderFields.from_data(data, None, 11)
+    assert order0.info['target'] is order1.info['target']
+    assert target_string_cache_info().hits == hits + 1
+    with pytest.raises(TypeError):
+        order0.info['target']['Client@1']['Name'] = 'baz'
@@ -0,0 +1,65 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import struct
+
+import pytest
+
+from oratools.demuxer import FileDemuxer
+from oratools.packet import Packet
+
+
+_PACKETS = [Packet(i % 4, i // 2, bytes([i & 0xff]) * (i * 13 % 200)) for i in range(100)]
+
+
+def _footer(yaml):
+    game_data = struct.pack('<i', len(yaml)) + yaml
+    return struct.pack('<ii', -1, 1) + game_data + struct.pack('<ii', len(game_data), -2)
+
+
+def _read_all(path, use_mmap):
+    '''Demux the replay; return the packets and the error (if any)'''
+    packets = []
+    with open(path, 'rb') as f:
+        fmt = FileDemuxer(f, 'test', use_mmap)
+        try:
+            for pkt in fmt.read_packet():
+                packets.append((pkt.client, pkt.frame, bytes(pkt.data)))
+        except ValueError as e:
+            return packets, str(e)
+    return packets, None
+
+
+_STREAM = b''.join(pkt.to_bytes() for pkt in _PACKETS)
+_EXPECTED = [(pkt.client, pkt.frame, pkt.data) for pkt in _PACKETS]
+
+
+@pytest.mark.parametrize('data, nb_packets, has_error', [
+    (_STREAM + _footer(b'Root:\n\tVersion: test\n'), len(_PACKETS), False),
+    # Truncated header
+    (_STREAM[:-len(_PACKETS[-1].data) - 6], len(_PACKETS) - 1, True),
+    # Truncated payload
+    (_STREAM[:-1], len(_PACKETS) - 1, False),
+    (b'', 0, True),
+])
+def test_mmap(tmp_path, data, nb_packets, has_error):
+    path = tmp_path / 'test.orarep'
+    path.write_bytes(data)
+    packets, error = _read_all(path, False)
+    assert packets == _EXPECTED[:nb_packets]
+    assert (error is not None) == has_error
+    assert _read_all(path, True) == (packets, error)
@@ -0,0 +1,77 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import struct
+
+from oratools import csharp, pipeline
+from oratools.decoder import OrderFields
+from oratools.desync import DesyncAnalyzer, SyncChecker
+from oratools.packet import Packet
+from oratools.recorder import ReplayWriter
+
+
+def test_sync_checker():
+    checker = SyncChecker(window=2)
+    assert checker.feed(1, 10, 'a') == []
+    assert checker.feed(2, 10, 'a') == []
+    assert checker.feed(1, 11, 'a') == []
+    assert checker.feed(2, 11, 'b') == []
+    assert checker.feed(1, 12, 'a') == []
+    assert checker.feed(1, 13, 'a') == [(11, {1: 'a', 2: 'b'})]
+    assert checker.feed(2, 12, 'a') == []
+    assert checker._pending.keys() == {12, 13}
+    assert checker.feed(2, 10, 'c') == []
+    assert checker.nb_late == 1
+    assert checker.feed(2, 13, 'b') == []
+    assert checker.close() == [(13, {1: 'a', 2: 'b'})]
+    assert checker.nb_frames == 4
+
+
+def _sync_hash(client, frame, sync_hash):
+    return Packet(client, frame, b'\x65' + struct.pack('<IQ', sync_hash, 0))
+
+
+def test_desync(tmp_path):
+    handshake = csharp.serialize_string(b'Handshake:\n\tOrdersProtocol: 11\n')
+    sync_info = csharp.serialize_string(b'Client@1:\n\tName: foo\nClient@2:\n\tName: bar\nClient@3:\n\tName: baz\n')
+    packets = [
+        Packet(0, 0, b'\xfe' + csharp.serialize_string(b'HandshakeResponse') + handshake),
+        Packet(0, 0, b'\xff' + csharp.serialize_string(b'SyncInfo') + struct.pack('<h', OrderFields._FLAG_TARGETSTRING) + sync_info),
+    ]
+    for frame in range(1, 2000):
+        for client in (1, 2, 3):
+            # Every client reports its hashes a few frames late
+            sync_frame = frame - client
+            if sync_frame > 0:
+                sync_hash = sync_frame + 1 if client == 2 and sync_frame >= 1500 else sync_frame
+                packets.append(_sync_hash(client, sync_frame, sync_hash))
+    replay = tmp_path / 'test.orarep'
+    with open(replay, 'wb') as f:
+        writer = ReplayWriter(f)
+        for pkt in packets:
+            writer.write_packet(pkt)
+        writer.close({'Root': {'Version': 'test'}})
+
+    args = argparse.Namespace(no_cache=True, forced_version=None, mmap=False, start=None, until=None)
+    result = pipeline.get_results(str(replay), args, [DesyncAnalyzer])
+    desync = result['results']['desync']['desync']
+    assert desync['frame'] == 1500
+    assert desync['groups'] == [
+        dict(sync_hash=1500, defeat_state=0, clients=['foo', 'baz']),
+        dict(sync_hash=1501, defeat_state=0, clients=['bar']),
+    ]
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import json
+import struct
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oratools import csharp
+from oratools.decoder import OrderFields
+from oratools.export import export
+from oratools.packet import Packet
+from oratools.recorder import ReplayWriter
+
+
+def _fields(field, flags, data):
+    return b'\xff' + csharp.serialize_string(field) + struct.pack('<h', flags) + data
+
+
+def test_export(tmp_path):
+    handshake = csharp.serialize_string(b'Handshake:\n\tOrdersProtocol: 11\n')
+    packets = [Packet(0, 0, b'\xfe' + csharp.serialize_string(b'HandshakeResponse') + handshake)]
+    groups = []
+    flags = OrderFields._FLAG_SUBJECT | OrderFields._FLAG_GROUPED
+    for frame in range(1, 51):
+        actors = list(range(frame % 7))
+        groups.append(actors)
+        data = struct.pack(f'<Ii{len(actors)}I', frame, len(actors), *actors)
+        packets.append(Packet(1, frame, _fields(b'CreateGroup', flags, data)))
+
+    replay = tmp_path / 'test.orarep'
+    with open(replay, 'wb') as f:
+        writer = ReplayWriter(f)
+        for pkt in packets:
+            writer.write_packet(pkt)
+        writer.close({'Root': {'Version': 'test'}})
+
+    out_dir = tmp_path / 'out'
+    args = argparse.Namespace(out_dir=str(out_dir), chunk_size=8, filter=None, forced_version=None, mmap=False)
+    export([str(replay)], args)
+
+    nb_orders = len(packets)
+    frame = np.load(out_dir / 'frame.npy', mmap_mode='r')
+    subject_id = np.load(out_dir / 'subject_id.npy', mmap_mode='r')
+    actors = np.load(out_dir / 'grouped_actors.npy', mmap_mode='r')
+    offsets = np.load(out_dir / 'grouped_actors_offsets.npy', mmap_mode='r')
+    assert frame.shape == subject_id.shape == (nb_orders,)
+    assert frame.tolist() == [pkt.frame for pkt in packets]
+    assert offsets.shape == (nb_orders + 1,)
+    assert offsets[-1] == len(actors) == sum(len(group) for group in groups)
+    # The handshake has no actors
+    assert [actors[offsets[i]:offsets[i + 1]].tolist() for i in range(1, nb_orders)] == groups
+    assert np.load(out_dir / 'extra_actors_offsets.npy', mmap_mode='r').tolist() == [0] * (nb_orders + 1)
+
+    with open(out_dir / 'metadata.json') as f:
+        metadata = json.load(f)
+    assert metadata['replays'] == [str(replay)]
+    assert metadata['fields'] == ['CreateGroup']
@@ -0,0 +1,38 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import io
+
+import pytest
+
+from oratools import jsonl, miniyaml
+
+
+def test_writer():
+    output = io.BytesIO()
+    writer = jsonl.JsonlWriter(output)
+    lobby = miniyaml.freeze(miniyaml.load(b'Client@1:\n\tName: foo\n\tColor: \xc3\xa9\n'))
+    writer.write(dict(data=b'ab\xffc', view=memoryview(b'xyz')[1:], lobby=lobby, name='é'))
+    writer.write_raw(b'{"raw":1}\n')
+    writer.write([])
+    assert output.getvalue().decode().splitlines() == [
+        '{"data":"ab�c","view":"yz","lobby":{"Client@1":{"Name":"foo","Color":"é"}},"name":"é"}',
+        '{"raw":1}',
+        '[]',
+    ]
+    with pytest.raises(TypeError):
+        writer.write(dict(value=object()))
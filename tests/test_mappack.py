@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import os
+import zipfile
+
+import pytest
+
+from oratools.mappack import mappack
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_mappack(tmp_path, jobs):
+    maps = []
+    for i, title in enumerate(['Foo Bar', 'Foo  Bar!', 'foo-bar [TAG]', 'Other']):
+        mapfile = str(tmp_path / f'm{i}.oramap')
+        with zipfile.ZipFile(mapfile, 'w') as zipf:
+            zipf.writestr('map.yaml', f'MapFormat: 11\n\nTitle: {title}\n\nCategories: Conquest\n')
+            zipf.writestr('map.bin', b'\0' * 100)
+        maps.append(mapfile)
+
+    out_dir = tmp_path / 'out'
+    args = argparse.Namespace(maps=maps, category='Test', title=None, strip_tags=True, overlay=None, ext=None,
+                              rm=None, out_dir=str(out_dir), jobs=jobs)
+    mappack(args)
+
+    assert sorted(os.listdir(out_dir)) == ['foo-bar-2.oramap', 'foo-bar-3.oramap', 'foo-bar.oramap', 'other.oramap']
+    with zipfile.ZipFile(out_dir / 'foo-bar-3.oramap') as zipf:
+        map_yaml = zipf.read('map.yaml').decode()
+    assert 'Title: foo-bar\n' in map_yaml
+    assert 'Categories: Test\n' in map_yaml
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_mappack_failure(tmp_path, jobs, caplog):
+    maps = []
+    # The leading empty line of the second map.yaml makes its packing fail
+    for i, map_yaml in enumerate(['Title: Foo\n', '\nTitle: Broken\n', 'Title: Bar\n']):
+        mapfile = str(tmp_path / f'm{i}.oramap')
+        with zipfile.ZipFile(mapfile, 'w') as zipf:
+            zipf.writestr('map.yaml', map_yaml)
+        maps.append(mapfile)
+
+    # Maps which cannot even be named: no Title, and not a zip file
+    mapfile = str(tmp_path / 'notitle.oramap')
+    with zipfile.ZipFile(mapfile, 'w') as zipf:
+        zipf.writestr('map.yaml', 'MapFormat: 11\n')
+    maps.append(mapfile)
+    mapfile = tmp_path / 'notzip.oramap'
+    mapfile.write_bytes(b'not a zip file')
+    maps.append(str(mapfile))
+
+    out_dir = tmp_path / 'out'
+    args = argparse.Namespace(maps=maps, category=None, title=None, strip_tags=False, overlay=None, ext=None,
+                              rm=None, out_dir=str(out_dir), jobs=jobs)
+    with pytest.raises(SystemExit) as excinfo:
+        mappack(args)
+    assert excinfo.value.code == 1
+    assert '3 map(s) out of 5 could not be packed' in caplog.text
+    assert sorted(os.listdir(out_dir)) == ['bar.oramap', 'foo.oramap']
@@ -1,5 +1,15 @@
+import copy
+import os
+import os.path as op
+import pickle
+
+import pytest
+
 from oratools import miniyaml
 
+import legacy_miniyaml
+
+
 def test():
     d = miniyaml.load(b'''
 A:
@@ -25,3 +35,71 @@ A:
             }
         }
     }
+
+
+_SAMPLES = [
+    b'',
+    b'\n\n',
+    b'A:',
+    b'A: x',
+    b'A:\n\tB:\n',
+    b'A:\r\n\tB: x y \r\n\tC:\r\n',
+    b'# comment\nA: 1\n:\n\tno key\nB:   spaced: value\n',
+    b'A:\n\tB:\nA: x\n\tC: orphan\nD:\n',
+    b'A:\n\tB:\n\t\tC: 1\n\tB: 2\n\t\tD: 3\nE:\n',
+    b'Client@0:\n\tName: \xc3\xa9t\xc3\xa9\n\tColor: FF0000\nClient@1:\n\tName: x\n',
+]
+
+
+def _sample_files():
+    root = op.join(op.dirname(__file__), '..', 'maps-extensions')
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith('.yaml'):
+                with open(op.join(dirpath, filename), 'rb') as f:
+                    yield f.read()
+
+
+def _load_chunks(sample, chunk_size):
+    loader = miniyaml.Loader()
+    for i in range(0, len(sample), chunk_size):
+        loader.feed(sample[i:i + chunk_size])
+    return loader.close()
+
+
+def test_reference():
+    for sample in _SAMPLES + list(_sample_files()):
+        try:
+            expected = legacy_miniyaml.load(sample)
+        except IndexError:
+            # Keys with both a value and children are not supported
+            with pytest.raises(ValueError):
+                miniyaml.load(sample)
+            continue
+
+        assert miniyaml.load(sample) == expected
+        for chunk_size in (1, 2, 3, 7, 64):
+            assert _load_chunks(sample, chunk_size) == expected
+
+
+@pytest.mark.parametrize('sample', [
+    b'\tA: x\n',
+    b'\tA:\n',
+    b'A: x\n\tB: y\n',
+    b'A:\n\t\tB:\n',
+    b'A:\n\tB: x\n\t\t\tC:\n',
+])
+def test_invalid_indentation(sample):
+    with pytest.raises(ValueError, match='Unexpected indentation'):
+        miniyaml.load(sample)
+    with pytest.raises(ValueError, match='Unexpected indentation'):
+        _load_chunks(sample, 1)
+
+
+def test_frozen():
+    d = miniyaml.freeze({'A': {'foo': 'bar', 'B': {'C': ''}}, 'D': 'x'})
+    with pytest.raises(TypeError):
+        d['A']['foo'] = 'baz'
+    for copied in (pickle.loads(pickle.dumps(d)), copy.copy(d), copy.deepcopy(d)):
+        assert copied == d
+        assert type(copied['A']['B']) is miniyaml.FrozenDict
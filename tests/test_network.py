@@ -0,0 +1,99 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import socket
+import struct
+import threading
+
+import pytest
+
+from oratools import live
+from oratools.network import SocketReader
+from oratools.packet import Packet
+
+
+def _received_packet(client, frame, data):
+    return struct.pack('<iii', len(data) + 4, client, frame) + data
+
+
+_PACKETS = [(i % 3, i, bytes([i & 0xff]) * (i * 37 % 3000)) for i in range(200)]
+
+
+def _send(sock, data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        sock.sendall(data[i:i + chunk_size])
+    sock.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 1 << 20])
+def test_socket_reader(chunk_size):
+    stream = b''.join(_received_packet(*pkt) for pkt in _PACKETS)
+    server, client = socket.socketpair()
+    sender = threading.Thread(target=_send, args=(server, stream, chunk_size))
+    sender.start()
+
+    # The small buffer forces the reader to both compact and grow its buffer
+    reader = SocketReader(client, buffer_size=256)
+    for client_id, frame, data in _PACKETS:
+        pkt = Packet.from_socket(reader)
+        assert (pkt.client, pkt.frame, pkt.data) == (client_id, frame, data)
+    with pytest.raises(Exception, match='Unexpected EOF'):
+        Packet.from_socket(reader)
+
+    sender.join()
+    client.close()
+
+
+def test_live_follow():
+    # Stand-in game servers streaming SyncHash orders, the last one being
+    # truncated in the middle of its last packet
+    packets = [(i % 3, i, b'\x65' + struct.pack('<I', i * 7)) for i in range(500)]
+    stream = b''.join(_received_packet(*pkt) for pkt in packets)
+
+    def get_handler(data):
+        async def handle(reader, writer):
+            writer.write(data)
+            await writer.drain()
+            writer.close()
+        return handle
+
+    async def run():
+        servers = [
+            await asyncio.start_server(get_handler(stream), '127.0.0.1', 0),
+            await asyncio.start_server(get_handler(stream), '127.0.0.1', 0),
+            await asyncio.start_server(get_handler(stream[:-1]), '127.0.0.1', 0),
+        ]
+        endpoints = [server.sockets[0].getsockname()[:2] for server in servers]
+        received = {endpoint: [] for endpoint in endpoints}
+
+        def feed(endpoint, pkt, order):
+            received[endpoint].append((pkt.client, pkt.frame, order.sync_hash))
+
+        errors = await live.follow(endpoints, 'test', feed, timeout=5)
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+        return endpoints, received, errors
+
+    endpoints, received, errors = asyncio.run(run())
+    expected = [(client, frame, frame * 7) for client, frame, _ in packets]
+    assert errors[:2] == [None, None]
+    assert 'Unexpected EOF' in str(errors[2])
+    for endpoint in endpoints[:2]:
+        assert received[endpoint] == expected
+    assert received[endpoints[2]] == expected[:-1]
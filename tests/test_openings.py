@@ -0,0 +1,52 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oratools import openings
+
+
+def test_percentiles():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 10, 1000)
+    values = rng.random(1000)
+    counts = np.bincount(groups)
+    percentiles = openings._get_percentiles(groups, counts, values)
+    for group in range(10):
+        expected = np.percentile(values[groups == group], [q * 100 for q in openings._PERCENTILES])
+        assert np.allclose(percentiles[group], expected)
+
+
+def test_aggregator():
+    game_info = {'Root': {'Version': 'test'}}
+    aggregator = openings._Aggregator(2)
+    aggregator.add(game_info, [
+        (1, 'Won', ['powr', 'tent'], [10, 20]),
+        (2, 'Lost', ['powr', 'proc'], [12, 30]),
+    ])
+    aggregator.add(game_info, [
+        (1, 'Lost', ['powr', 'tent'], [14, 40]),
+        (2, None, ['powr'], [12]),
+        (3, 'Won', ['powr', 'tent'], [12, 30]),
+    ])
+    assert aggregator.nb_incomplete == 1
+    assert aggregator.get_stats() == [
+        (['powr', 'tent'], 3, 2, 1, [[11, 12, 13], [25, 30, 35]]),
+        (['powr', 'proc'], 1, 0, 1, [[12, 12, 12], [30, 30, 30]]),
+    ]
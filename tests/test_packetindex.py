@@ -0,0 +1,142 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import os
+
+import pytest
+
+from oratools.decoder import Decoder, parse_frame_time
+from oratools.demuxer import FileDemuxer
+from oratools.packet import Packet
+from oratools import packetindex
+from oratools.packetindex import PacketIndex
+from oratools.recorder import ReplayWriter
+
+
+def _get_packets(nb_frames=20):
+    # Frame 0 packets (handshake, lobby sync) followed by the packets of
+    # every frame interleaved with late ones from the previous frame
+    packets = [Packet(0, 0, b'handshake'), Packet(0, 0, b'sync')]
+    for frame in range(1, nb_frames + 1):
+        packets.append(Packet(1, frame, b'a%d' % frame))
+        if frame > 1:
+            packets.append(Packet(2, frame - 1, b'b%d' % frame))
+    return packets
+
+
+def _write_replay(path, packets):
+    with open(path, 'wb') as f:
+        writer = ReplayWriter(f)
+        for pkt in packets:
+            writer.write_packet(pkt)
+        writer.close({'Root': {'Version': 'test'}})
+
+
+@pytest.mark.parametrize('start_frame, end_frame', [
+    (None, None),
+    (5, None),
+    (None, 7),
+    (5, 7),
+    (0, 3),
+    (20, 20),
+    # Out of range bounds
+    (100, None),
+    (None, -5),
+    (10, 5),
+    (-10, 100),
+])
+def test_read_packet(tmp_path, monkeypatch, start_frame, end_frame):
+    packets = _get_packets()
+    path = tmp_path / 'test.orarep'
+    _write_replay(path, packets)
+
+    def in_range(frame):
+        if start_frame is not None and frame < start_frame:
+            # The frame 0 packets are always honored
+            return frame == 0
+        return end_frame is None or frame <= end_frame
+
+    expected = [(pkt.client, pkt.frame, pkt.data) for pkt in packets if in_range(pkt.frame)]
+
+    with open(path, 'rb') as f:
+        demuxer = FileDemuxer(f)
+        index = PacketIndex.build(demuxer)
+        assert len(index.entries) == len(packets)
+        result = [(pkt.client, pkt.frame, pkt.data) for pkt in index.read_packet(demuxer, start_frame, end_frame)]
+    assert result == expected
+
+    # Same filtering when reading the replay in order, with the index built
+    # along the way
+    if start_frame is not None:
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+        with open(path, 'rb') as f:
+            demuxer = FileDemuxer(f)
+            result = [(pkt.client, pkt.frame, pkt.data)
+                      for pkt in packetindex._read_and_index(str(path), demuxer, start_frame, end_frame)]
+        assert result == expected
+        assert PacketIndex.get_cached(str(path)).entries == index.entries
+
+
+def test_frame_time():
+    assert parse_frame_time('20') == (20, None)
+    assert parse_frame_time('20.5s') == (None, 20.5)
+    assert parse_frame_time('1:02.5') == (None, 62.5)
+    assert parse_frame_time('1:00:02') == (None, 3602)
+    for invalid in ('20.5', '', '1:2:3:4', 'abc', '-3', '1:'):
+        with pytest.raises(ValueError):
+            parse_frame_time(invalid)
+
+    dec = Decoder({'Root': {'Version': 'test'}})
+    assert dec.get_frame_id('20') == 20
+    assert dec.get_frame_id('1:00.000') == 500
+    assert dec.get_frame_id('60s') == 500
+    assert dec.get_frame_id(dec.get_frame_time(1234)) == 1234
+
+
+def test_read_until(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    packets = _get_packets(1000)
+    path = str(tmp_path / 'test.orarep')
+    _write_replay(path, packets)
+    expected = [(pkt.client, pkt.frame, pkt.data) for pkt in packets if pkt.frame <= 100]
+    args = argparse.Namespace(start=None, until='100')
+    dec = Decoder({'Root': {'Version': 'test'}})
+
+    # Without an index, the replay is only demuxed up to the end of the range
+    with open(path, 'rb') as f:
+        demuxer = FileDemuxer(f)
+        result = [(pkt.client, pkt.frame, pkt.data) for pkt in packetindex.read_packet(path, demuxer, dec, args)]
+        assert demuxer.tell() < os.path.getsize(path) // 2
+    assert result == expected
+    assert PacketIndex.get_cached(path) is None
+
+    # The index is built along with a --from read, and used afterwards
+    from_args = argparse.Namespace(start='50', until=None)
+    from_expected = [(pkt.client, pkt.frame, pkt.data) for pkt in packets if pkt.frame == 0 or pkt.frame >= 50]
+    for _ in range(2):
+        with open(path, 'rb') as f:
+            demuxer = FileDemuxer(f)
+            result = [(pkt.client, pkt.frame, pkt.data)
+                      for pkt in packetindex.read_packet(path, demuxer, dec, from_args)]
+        assert result == from_expected
+        assert len(PacketIndex.get_cached(path).entries) == len(packets)
+
+    with open(path, 'rb') as f:
+        demuxer = FileDemuxer(f)
+        result = [(pkt.client, pkt.frame, pkt.data) for pkt in packetindex.read_packet(path, demuxer, dec, args)]
+    assert result == expected
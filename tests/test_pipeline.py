@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+
+from oratools import packetindex, pipeline
+from oratools.buildorder import BuildOrderAnalyzer
+from oratools.chat import ChatAnalyzer
+from oratools.stats import StatsAnalyzer
+
+from replays import get_packets, write_replay
+
+
+def _get_results(monkeypatch, path, analyzer_classes, max_steps=None):
+    '''Results of the analyzers along with the number of packets demuxed'''
+    nb_packets = 0
+    read_packet = packetindex.read_packet
+
+    def counting_read_packet(*args):
+        nonlocal nb_packets
+        for pkt in read_packet(*args):
+            nb_packets += 1
+            yield pkt
+
+    monkeypatch.setattr(packetindex, 'read_packet', counting_read_packet)
+    args = argparse.Namespace(forced_version=None, mmap=False, start=None, until=None, no_cache=True,
+                              max_steps=max_steps)
+    result = pipeline.get_results(path, args, analyzer_classes)
+    assert result['error'] is None
+    return result['results'], nb_packets
+
+
+def test_single_pass(tmp_path, monkeypatch):
+    path = str(tmp_path / 'test.orarep')
+    write_replay(path)
+    nb_packets = len(get_packets())
+    analyzers = [ChatAnalyzer, BuildOrderAnalyzer, StatsAnalyzer]
+
+    # A single demux pass dispatching to all the analyzers gives the same
+    # results as every analyzer alone, despite their different orders filter
+    results, nb_read = _get_results(monkeypatch, path, analyzers)
+    assert nb_read == nb_packets
+    for cls in analyzers:
+        alone, _ = _get_results(monkeypatch, path, [cls])
+        assert results[cls.NAME] == alone[cls.NAME]
+    assert results['chat'] and results['buildorder']['builds']
+    assert dict(results['stats'])['Fields:Chat'] == len(results['chat'])
+
+    # The build order alone stops the demuxing once all the players have
+    # their steps, but not while the other analyzers are still interested
+    alone, nb_read = _get_results(monkeypatch, path, [BuildOrderAnalyzer], max_steps=3)
+    assert [len(build['steps']) for build in alone['buildorder']['builds']] == [3, 3]
+    assert nb_read < nb_packets // 4
+    results, nb_read = _get_results(monkeypatch, path, analyzers, max_steps=3)
+    assert nb_read == nb_packets
+    assert results['buildorder'] == alone['buildorder']
+    assert results['stats'] == _get_results(monkeypatch, path, [StatsAnalyzer])[0]['stats']
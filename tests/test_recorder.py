@@ -0,0 +1,130 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import io
+import struct
+
+from oratools import csharp, miniyaml
+from oratools.decoder import OrderFields
+from oratools.demuxer import AsyncSocketDemuxer, FileDemuxer
+from oratools.packet import Packet
+from oratools.recorder import FanOut, record, serve_subscribers
+
+
+def _get_packets():
+    sync_info = csharp.serialize_string(b'Client@1:\n\tName: foo\nClient@2:\n\tName: bar\n')
+    handshake = csharp.serialize_string(b'Handshake:\n\tOrdersProtocol: 11\n')
+    packets = [
+        Packet(0, 0, b'\xfe' + csharp.serialize_string(b'HandshakeResponse') + handshake),
+        Packet(0, 0, b'\xff' + csharp.serialize_string(b'SyncInfo') + struct.pack('<h', OrderFields._FLAG_TARGETSTRING) + sync_info),
+    ]
+    packets += [Packet(1 + i % 2, i, b'\x65' + struct.pack('<I', i)) for i in range(1, 300)]
+    return packets
+
+
+def test_miniyaml_serialize():
+    data = {'Root': {'Version': 'test', 'Empty': '', 'Sub': {'A': 'b c'}}, 'Player@1': {'Name': 'foo'}}
+    assert miniyaml.load(miniyaml.serialize(data)) == data
+
+
+def test_record():
+    packets = _get_packets()
+    output = io.BytesIO()
+
+    async def run():
+        start = asyncio.Event()
+
+        async def handle(reader, writer):
+            await start.wait()
+            for pkt in packets:
+                writer.write(pkt.to_bytes(swapped=False))
+            await writer.drain()
+            writer.close()
+
+        game_server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        demuxer = await AsyncSocketDemuxer.connect(*game_server.sockets[0].getsockname()[:2])
+
+        fanout = FanOut()
+        subscription = fanout.subscribe()
+        slow_subscription = fanout.subscribe(maxsize=10)
+        relay = await serve_subscribers(fanout, '127.0.0.1', 0)
+        relay_demuxer = await AsyncSocketDemuxer.connect(*relay.sockets[0].getsockname()[:2])
+        while len(fanout._subscriptions) < 3:
+            await asyncio.sleep(0.01)
+
+        async def read_all(stream):
+            return [(pkt.client, pkt.frame, bytes(pkt.data)) async for pkt in stream.read_packet()]
+
+        start.set()
+        readers = asyncio.gather(read_all(subscription), read_all(relay_demuxer))
+        await record(demuxer, output, 'test', fanout)
+        received, relayed = await readers
+        slow_received = await read_all(slow_subscription)
+
+        for server in (game_server, relay):
+            server.close()
+            await server.wait_closed()
+        await demuxer.close()
+        await relay_demuxer.close()
+        return received, relayed, slow_received
+
+    received, relayed, slow_received = asyncio.run(run())
+    expected = [(pkt.client, pkt.frame, pkt.data) for pkt in packets]
+    assert received == expected
+    assert relayed == expected
+    assert slow_received == []
+
+    output.seek(0)
+    demuxer = FileDemuxer(output)
+    assert [(pkt.client, pkt.frame, pkt.data) for pkt in demuxer.read_packet()] == expected
+    assert demuxer.game_info['Root']['Version'] == 'test'
+    assert demuxer.game_info['Root']['FinalGameTick'] == str(299 * 3)
+    assert demuxer.game_info['Player@1']['Name'] == 'foo'
+    assert demuxer.game_info['Player@2']['Name'] == 'bar'
+
+
+def test_fanout():
+    packets = _get_packets()
+
+    async def run():
+        fanout = FanOut()
+
+        # A blocking subscriber failing while the stream is waiting on it
+        failing = fanout.subscribe(maxsize=4, blocking=True)
+
+        async def fail():
+            try:
+                async for pkt in failing.read_packet():
+                    raise ValueError('failing subscriber')
+            finally:
+                fanout.unsubscribe(failing)
+
+        task = asyncio.create_task(fail())
+        full = fanout.subscribe(maxsize=len(packets))
+        for pkt in packets[:len(packets) - 1]:
+            await fanout.publish(pkt)
+        fanout.unsubscribe(failing)
+        assert task.done() and isinstance(task.exception(), ValueError)
+
+        # A non-blocking subscriber with a full queue on close is dropped
+        # instead of stalling the close
+        await fanout.publish(packets[-1])
+        await asyncio.wait_for(fanout.close(), 1)
+        return [pkt async for pkt in full.read_packet()]
+
+    assert asyncio.run(run()) == []
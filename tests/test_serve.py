@@ -0,0 +1,73 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import struct
+import time
+
+from oratools.demuxer import AsyncSocketDemuxer
+from oratools.packet import Packet
+from oratools.recorder import ReplayWriter
+from oratools.serve import Playback, start_server
+
+
+def _write_replay(path, packets):
+    with open(path, 'wb') as f:
+        writer = ReplayWriter(f)
+        for pkt in packets:
+            writer.write_packet(pkt)
+        writer.close({'Root': {'Version': 'test'}})
+
+
+def test_serve(tmp_path):
+    # Late packets from previous frames interleaved, as in real replays
+    packets = []
+    for frame in range(1, 6):
+        packets.append(Packet(1, frame, b'\x65' + struct.pack('<I', frame)))
+        packets.append(Packet(2, frame - 1, b''))
+    replay = tmp_path / 'test.orarep'
+    _write_replay(replay, packets)
+
+    playback = Playback.load(replay)
+    assert [t for t, _ in playback.chunks] == [0.12 * frame for frame in range(1, 6)]
+
+    async def run(speed, nb_clients):
+        server = await start_server([playback], '127.0.0.1', 0, speed)
+        address = server.sockets[0].getsockname()[:2]
+
+        async def read_all():
+            demuxer = await AsyncSocketDemuxer.connect(*address, timeout=5)
+            received = [(pkt.client, pkt.frame, pkt.data) async for pkt in demuxer.read_packet()]
+            await demuxer.close()
+            return received
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(read_all() for _ in range(nb_clients)))
+        elapsed = time.perf_counter() - t0
+        server.close()
+        await server.wait_closed()
+        return results, elapsed
+
+    expected = [(pkt.client, pkt.frame, pkt.data) for pkt in packets]
+
+    results, elapsed = asyncio.run(run(0, 50))
+    assert results == [expected] * 50
+
+    # The last frame is at 600ms
+    results, elapsed = asyncio.run(run(10, 5))
+    assert results == [expected] * 5
+    assert elapsed >= 0.06
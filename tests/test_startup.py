@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+
+def _get_imported_modules(module):
+    code = f'import sys, {module}; print("\\n".join(sys.modules))'
+    return set(subprocess.check_output([sys.executable, '-c', code], text=True).split())
+
+
+def test_cli_lazy_imports():
+    modules = _get_imported_modules('oratools.cli')
+    heavy = {'PIL', 'multiprocessing', 'sqlite3', 'zipfile', 'tempfile', 'pprint'}
+    assert not modules & heavy
+    assert {m for m in modules if m.startswith('oratools.')} == {'oratools.cli'}
+
+
+def test_replay_tools_lazy_imports():
+    for tool in ('chat', 'buildorder', 'info', 'trace', 'analyze'):
+        modules = _get_imported_modules(f'oratools.{tool}')
+        assert 'PIL' not in modules
+        assert 'oratools.mappack' not in modules